@@ -10,13 +10,19 @@ from logging.handlers import RotatingFileHandler
 import globals
 from pypylon import pylon
 from cameracontrol import (apply_camera_settings, set_centered_offset, 
-                           validate_and_set_camera_param, get_camera_properties, Handler)
+                           validate_and_set_camera_param, get_camera_properties)
 import porthandler
 import imageprocessing
 import threading
 from settings_manager import load_settings, save_settings, get_settings
 import numpy as np
-from statistics_processor import calculate_statistics, save_annotated_image
+from statistics_processor import statistics_engine
+from measurement_store import MeasurementStore
+from image_writer import image_writer
+from annotation_cache import annotations
+from location_tracker import tracker
+from dot_map import dot_maps
+from frame_source import frame_sources, SNAPSHOT_TIMEOUT
 
 app = Flask(__name__)
 app.secret_key = 'Zoltek'
@@ -47,7 +53,7 @@ latest_frames = {
 }
 
 if not hasattr(globals, 'measurement_data'):
-    globals.measurement_data = []  # This will store all the dot_contours arrays.
+    globals.measurement_data = MeasurementStore()  # This will store all the dot_contours arrays.
 if not hasattr(globals, 'result_counts'):
     globals.result_counts = [0, 0, 0]  # One counter per result class.
 
@@ -115,29 +121,33 @@ def home_turntable_with_image():
         app.logger.info("Homing process initiated.")
         camera_type = 'main'
 
-        # Step 1: Grab the image QUICKLY and RELEASE the camera
-        with globals.grab_locks[camera_type]:
-            camera = globals.cameras.get(camera_type)
-
-            if camera is None or not camera.IsOpen():
-                app.logger.error("Main camera is not connected or open.")
-                return jsonify({"error": "Main camera is not connected or open."}), 400
-
-            grab_result = camera.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
-
-            if not grab_result.GrabSucceeded():
-                grab_result.Release()
-                app.logger.error("Failed to grab image from camera.")
-                return jsonify({"error": "Failed to grab image from camera."}), 500
-
-            app.logger.info("Image grabbed successfully.")
-            image = grab_result.Array
-            grab_result.Release()  # Release camera lock immediately
+        # Step 1: Take a frame of the frame source, the camera is never held
+        frame, error = grab_analysis_image(camera_type)
+        if error:
+            return error
+        app.logger.info("Image grabbed successfully.")
 
         # Step 2: Process the image and calculate rotation
-        rotation_needed = imageprocessing.home_turntable_with_image(image)
+        # The engine can be picked per call, otherwise it comes from settings.json
+        homing_settings = get_settings().get('homing', {})
+        data = request.get_json(silent=True) or {}
+        engine = data.get('engine') or homing_settings.get('engine', 'sweep')
+
+        with frame:
+            rotation_needed, confidence = imageprocessing.home_turntable_with_image(
+                frame.image, engine=engine, return_confidence=True)
+
+            min_confidence = homing_settings.get('logpolar_min_confidence', 0.1)
+            if engine == 'logpolar' and confidence < min_confidence:
+                app.logger.warning(f"Log-polar homing confidence {confidence:.3f} below {min_confidence}, "
+                                   "falling back to the template sweep.")
+                engine = 'sweep'
+                rotation_needed, confidence = imageprocessing.home_turntable_with_image(
+                    frame.image, engine=engine, return_confidence=True)
+
         command = f"{abs(rotation_needed)},{1 if rotation_needed > 0 else 0}"
-        app.logger.info(f"Image processing complete. Rotation needed: {rotation_needed}")
+        app.logger.info(f"Image processing complete ({engine}, confidence {confidence:.3f}). "
+                        f"Rotation needed: {rotation_needed}")
 
         # Step 3: Send rotation command & **wait for DONE**
         movement_success = porthandler.write_turntable(command)
@@ -156,6 +166,8 @@ def home_turntable_with_image():
         return jsonify({
             "message": "Homing successful",
             "rotation": rotation_needed,
+            "engine": engine,
+            "confidence": confidence,
             "current_position": globals.turntable_position
         })
 
@@ -165,6 +177,34 @@ def home_turntable_with_image():
 
 
 ### Image Analysis Function ###
+def grab_analysis_image(camera_type):
+    """
+    Takes the first frame of `camera_type` grabbed after this call from its frame source.
+    Waits at most one SNAPSHOT_TIMEOUT for it.
+
+    Returns:
+        (frame, None), or (None, error response) if the camera is not open or no frame arrived in time.
+        The frame is a pooled FrameBuffer, the pipelines read its read-only `image` and the
+        caller releases it when done.
+    """
+    requested_at = time.time()
+    source = frame_sources[camera_type]
+    if not source.start():
+        msg = f"{camera_type.capitalize()} camera is not connected or open."
+        app.logger.error(msg)
+        return None, (jsonify({"error": msg}), 400)
+
+    frame = source.snapshot(newer_than=requested_at)
+    if frame is None:
+        msg = f"No frame from {camera_type} camera within {SNAPSHOT_TIMEOUT:g} seconds."
+        app.logger.error(msg)
+        return None, (jsonify({"error": msg}), 500)
+
+    app.logger.debug(f"Analysis frame {frame.sequence} of {camera_type} camera, "
+                     f"{(time.time() - requested_at) * 1000:.0f} ms after the request.")
+    return frame, None
+
+
 def analyze_slice(process_func, camera_type, label):
     """
     Helper to reduce boilerplate in each route:
@@ -173,93 +213,62 @@ def analyze_slice(process_func, camera_type, label):
       - label: string key like 'center_circle', 'center_slice', 'outer_slice'
     """
     try:
-        with globals.grab_locks[camera_type]:
-            camera = globals.cameras.get(camera_type)
-            if camera is None or not camera.IsOpen():
-                msg = f"{camera_type.capitalize()} camera is not connected or open."
-                app.logger.error(msg)
-                return jsonify({"error": msg}), 400
-
-            # Retry grabbing the image up to 10 times
-            max_retries = 10
-            for attempt in range(max_retries):
-                grab_result = camera.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
-
-                if grab_result.GrabSucceeded():
-                    image = grab_result.Array
-                    grab_result.Release()
-                    globals.latest_image = image.copy()
-                    break  # Exit the loop if successful
-
-                grab_result.Release()
-                app.logger.warning(f"Attempt {attempt + 1}/{max_retries}: Failed to grab image from {camera_type} camera.")
-                time.sleep(0.1)  # Wait 100ms before retrying
-
-            else:
-                # If we exhaust retries, return an error
-                msg = f"Failed to grab image from {camera_type} camera after {max_retries} attempts."
-                app.logger.error(msg)
-                return jsonify({"error": msg}), 500
-
-
-        # 1) Detect new contours
-        new_dot_contours = process_func(image)
-        if isinstance(new_dot_contours, np.ndarray):
-            new_dot_contours = new_dot_contours.tolist()
-
-        # Convert np.int32 → Python int
-        new_dot_contours = [
-            [int(x) if isinstance(x, (np.int32, np.int64)) else x for x in dot]
-            for dot in new_dot_contours
-        ]
-
-        # 2) Append new dots with stable IDs
+        frame, error = grab_analysis_image(camera_type)
+        if error is not None:
+            return error
+
+        # Registration mode measures at the positions of the recorded reference dot map
+        dot_map = None
+        measurement_settings = get_settings().get('measurement', {})
+        if measurement_settings.get('engine', 'clustering') == 'registration':
+            product = measurement_settings.get('product', 'default')
+            dot_map = dot_maps.get(product, camera_type, label)
+            if dot_map is None:
+                app.logger.warning(f"No dot map recorded for {product}/{camera_type}/{label}, clustering instead.")
+
+        # 1) Detect new contours, in the region of the frame their coordinates refer to
+        with frame, image_writer.collect() as result_images:
+            new_dot_contours, region = process_func(frame.image, camera=camera_type, dot_map=dot_map,
+                                                    return_region=True)
+            # The region is kept for the annotation, a view into the pooled frame must not outlive it
+            if np.shares_memory(region, frame.array):
+                region = region.copy()
+
+        # 2) Append the new dots as one block, they get consecutive stable IDs
         #    e.g. new_dot_contours = [[x,y,col,area], ...]
-        old_counter = globals.dot_id_counter
-        for dot in new_dot_contours:
-            x, y, col, area = dot
-            dot_id = globals.dot_id_counter
-            globals.dot_id_counter += 1
-            globals.measurement_data.append([dot_id, x, y, col, area])
+        new_ids = globals.measurement_data.append(new_dot_contours)
 
         # Record how many new dots for this label
         globals.last_blob_counts[label] = len(new_dot_contours)
 
-        # 3) Classify entire dataset
-        result = calculate_statistics(globals.measurement_data)
+        # 3) Classify the entire dataset, only the columns the new dots moved are recomputed
+        result = statistics_engine.update(globals.measurement_data, new_ids)
         if "error" in result:
             app.logger.error(f"Calculation error in {label}: {result['error']}")
             return jsonify({"error": result["error"]}), 500
 
-        # This classification returns classified dots as (dot_id, x, y, col, area, class)
-        classified_dots = result["classified_dots"]
+        # 4) The newly added dots with their class, as a structured array (dot_id, x, y, col, area, cls)
+        latest_classified_dots = result["classified_dots"]
         final_counts = result["result_counts"]
 
-        # 4) Identify the newly added dot IDs
-        newly_added_ids = set(range(old_counter, globals.dot_id_counter))
-
-        # Extract only the newly classified dots (by ID)
-        latest_classified_dots = [
-            d for d in classified_dots
-            if d[0] in newly_added_ids
-        ]
+        # (x, y, col, area, cls) for annotation
+        latest_for_annotation = list(zip(
+            latest_classified_dots['x'].tolist(), latest_classified_dots['y'].tolist(),
+            latest_classified_dots['col'].tolist(), latest_classified_dots['area'].tolist(),
+            latest_classified_dots['cls'].tolist()))
 
-        # Convert (dot_id, x, y, col, area, cls) → (x, y, col, area, cls) for annotation
-        latest_for_annotation = [
-            (x, y, col, area, cls) for (dot_id, x, y, col, area, cls) in latest_classified_dots
-        ]
-
-        # 5) Annotate
-        save_path = save_annotated_image(globals.latest_image, latest_for_annotation, label)
+        # 5) Keep the region and dots, the annotated image is only rendered when requested
+        analysis_id = annotations.record(label, region, latest_classified_dots)
 
         # 6) Logging & Return
         app.logger.info(f"{label} analysis complete. {len(new_dot_contours)} new dots detected.")
-        app.logger.info(f"Saved annotated image: {save_path}")
 
         return jsonify({
             "message": f"{label} analysis successful",
             "dot_contours": latest_for_annotation,
-            "image_path": save_path,
+            "analysis_id": analysis_id,
+            "annotation_url": f"/api/annotations/{analysis_id}" if analysis_id else None,
+            "result_images": image_writer.statuses(result_images),
             "result_counts": final_counts
         })
 
@@ -295,6 +304,55 @@ def analyze_outer_slice():
         label='outer_slice',
     )
 
+# Analysis pipeline and camera of every region
+ANALYSIS_PIPELINES = {
+    'center_circle': (imageprocessing.process_center, 'main'),
+    'center_slice': (imageprocessing.process_inner_slice, 'main'),
+    'outer_slice': (imageprocessing.start_side_slice, 'side'),
+}
+
+@app.route('/api/dot-map/record', methods=['POST'])
+def record_dot_map():
+    """
+    Records the reference dot map of a region from a good tablet: grabs a frame, measures it
+    with the clustering pipeline and stores the dots per product and camera. Expects JSON
+    {"label": "center_circle" | "center_slice" | "outer_slice", "product": optional name}.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        label = data.get('label')
+        if label not in ANALYSIS_PIPELINES:
+            return jsonify({"error": f"Invalid label '{label}'"}), 400
+        product = data.get('product') or get_settings().get('measurement', {}).get('product', 'default')
+        process_func, camera_type = ANALYSIS_PIPELINES[label]
+
+        frame, error = grab_analysis_image(camera_type)
+        if error is not None:
+            return error
+
+        with frame:
+            dots = process_func(frame.image, camera=camera_type)
+        dot_map = dot_maps.record(product, camera_type, label, dots)
+        app.logger.info(f"Dot map recorded for {product}/{camera_type}/{label}: {len(dot_map)} dots.")
+        return jsonify({
+            "message": "Dot map recorded",
+            "product": product,
+            "camera": camera_type,
+            "label": label,
+            "dot_count": len(dot_map)
+        }), 200
+
+    except Exception as e:
+        app.logger.exception(f"Error recording dot map: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/dot-map', methods=['GET'])
+def get_dot_maps():
+    """
+    Dot count of every recorded reference dot map ("<product>_<camera>_<label>": count).
+    """
+    return jsonify(dot_maps.summary()), 200
+
 @app.route('/update_results', methods=['POST'])
 def update_results():
     try:
@@ -336,7 +394,7 @@ def update_results():
         globals.locked_class1_count += missing_blobs
 
         # Re-run classification
-        result = calculate_statistics(globals.measurement_data, expected_counts)
+        result = statistics_engine.update(globals.measurement_data)
         if "error" in result:
             return jsonify({"error": result["error"]}), 500
 
@@ -358,6 +416,7 @@ def reset_results():
         # Reset global measurement results
         globals.result_counts = [0, 0, 0]
         globals.measurement_data.clear()
+        statistics_engine.reset()
         globals.last_blob_counts = {"center_circle": 0, "center_slice": 0, "outer_slice": 0}
 
         app.logger.info("Results reset successfully.")
@@ -445,8 +504,8 @@ def select_folder():
 @app.route('/start-video-stream', methods=['GET'])
 def start_video_stream():
     """
-    Returns a live MJPEG response from generate_frames(camera_type).
-    This is the *only* place we call generate_frames, to avoid double-streaming.
+    Returns a live MJPEG response of the camera's frame source, starting it if needed.
+    Any number of clients share the one acquisition thread and its encoded frames.
     """
     try:
         camera_type = request.args.get('type')
@@ -462,14 +521,14 @@ def start_video_stream():
             app.logger.error(f"Camera connection failed: {res['error']}")
             return jsonify(res), 400
 
-        with globals.grab_locks[camera_type]:
-            if not globals.stream_running.get(camera_type, False):
-                globals.stream_running[camera_type] = True
-                app.logger.info(f"stream_running[{camera_type}] set to True in start_video_stream")
+        if not frame_sources[camera_type].start():
+            msg = f"{camera_type.capitalize()} camera is not connected or open."
+            app.logger.error(msg)
+            return jsonify({"error": msg}), 400
 
         app.logger.info(f"Starting video stream for {camera_type}")
         return Response(
-            generate_frames(camera_type, scale_factor),
+            frame_sources[camera_type].mjpeg_frames(scale_factor),
             mimetype='multipart/x-mixed-replace; boundary=frame'
         )
 
@@ -501,55 +560,6 @@ def stop_video_stream():
         app.logger.exception(f"Unexpected exception while stopping {camera_type} stream.")
         return jsonify({"error": str(e)}), 500
 
-def generate_frames(camera_type, scale_factor=0.25):
-    app.logger.info(f"Generating frames for {camera_type} with scale factor {scale_factor}")
-    camera = globals.cameras.get(camera_type)
-
-    if not camera:
-        app.logger.error(f"{camera_type.capitalize()} camera is not connected.")
-        return
-
-    if not camera.IsGrabbing():
-        app.logger.info(f"{camera_type.capitalize()} camera starting grabbing.")
-        camera.StartGrabbing(pylon.GrabStrategy_LatestImageOnly)
-
-    try:
-        while globals.stream_running[camera_type]:
-            with globals.grab_locks[camera_type]:
-                grab_result = camera.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
-
-                if grab_result.GrabSucceeded():
-                    image = grab_result.Array
-            
-                    if scale_factor != 1.0:
-                        width = int(image.shape[1] * scale_factor)
-                        height = int(image.shape[0] * scale_factor)
-                        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
-
-                    _, frame = cv2.imencode('.jpg', image)
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame.tobytes() + b'\r\n')
-                
-                grab_result.Release()
-        
-    except Exception as e:
-        app.logger.error(f"Error in {camera_type} video stream: {e}")
-
-        if "Device has been removed" in str(e):
-            globals.stream_running[camera_type] = False
-            if camera and camera.IsOpen():
-                try:
-                    camera.StopGrabbing()
-                    camera.Close()
-                except Exception as close_err:
-                    app.logger.error(f"Failed to close {camera_type} after unplug: {close_err}")
-            globals.cameras[camera_type] = None  # Now future status checks see `None => not connected`
-    
-    finally:
-        # stream_running[camera_type] = False
-        app.logger.info(f"{camera_type.capitalize()} camera streaming thread stopped.")
-
-
 @app.route('/connect-camera', methods=['POST'])
 def connect_camera():
     camera_type = request.args.get('type')
@@ -720,7 +730,7 @@ def video_stream():
         return jsonify({"error": "Invalid camera type specified"}), 400
 
     app.logger.info(f"{camera_type.capitalize()} camera stream started successfully")
-    return Response(generate_frames(camera_type), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(frame_sources[camera_type].mjpeg_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/api/get-camera-settings', methods=['GET'])
 def get_camera_settings():
@@ -762,10 +772,16 @@ def get_camera_name():
 
 @app.route('/api/save-image', methods=['POST'])
 def save_image():
-    global handler
+    """
+    Saves the next frame of a camera as IMG_<timestamp>.jpg.
+    Expects {"save_directory": path, "camera_type": optional, 'main' by default}.
+    """
     try:
         data = request.get_json()
         save_directory = data.get('save_directory', '').strip()
+        camera_type = data.get('camera_type', 'main')
+        if camera_type not in frame_sources:
+            return jsonify({"error": "Invalid camera type specified"}), 400
 
         app.logger.info(f"Received save directory: {save_directory}")
 
@@ -776,15 +792,15 @@ def save_image():
             app.logger.info(f"Creating directory: {save_directory}")
             os.makedirs(save_directory)
 
-        handler.folder_selected = save_directory
-        handler.set_save_next_frame()
-        app.logger.info("Triggered handler to save the next frame")
+        source = frame_sources[camera_type]
+        if not source.start():
+            return jsonify({"error": f"{camera_type.capitalize()} camera is not connected or open."}), 400
 
-        # Wait for the image to be saved
-        while not handler.saved_image_path:
-            pass
-        
-        saved_image_path = os.path.join(save_directory, handler.get_latest_image_name())
+        # Waits for the next frame of the frame source, not in the driver
+        saved_image_path = source.save_next_frame(save_directory)
+        if saved_image_path is None:
+            return jsonify({"error": f"No frame from {camera_type} camera within {SNAPSHOT_TIMEOUT:g} seconds."}), 500
+        app.logger.info(f"Image saved as {saved_image_path}")
 
         return jsonify({'message': 'Image saved', 'filename': os.path.basename(saved_image_path)}), 200
     except Exception as e:
@@ -795,30 +811,87 @@ def save_image():
 def get_barcode():
     return jsonify({'barcode': globals.latest_barcode})
 
+@app.route('/api/annotations', methods=['GET'])
+def get_annotations():
+    """
+    The analyses whose annotated image can still be rendered, and the render cache counters.
+    """
+    return jsonify({'analyses': annotations.analyses(), 'cache': annotations.stats()}), 200
+
+@app.route('/api/annotations/<analysis_id>', methods=['GET'])
+def get_annotation(analysis_id):
+    """
+    The annotated image of an analysis (class colored circles and column numbers), rendered on
+    the first request and cached. Optional ?scale= in (0, 1] and ?format=png|jpg.
+    """
+    scale = request.args.get('scale', 1.0, type=float)
+    image_format = request.args.get('format', 'png')
+    try:
+        encoded = annotations.render(analysis_id, scale, image_format)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.exception(f"Failed to render annotation {analysis_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+    if encoded is None:
+        return jsonify({'error': f"Analysis {analysis_id} is not available"}), 404
+    return Response(encoded, mimetype='image/png' if image_format == 'png' else 'image/jpeg')
+
+@app.route('/api/image-status', methods=['GET'])
+def get_image_status():
+    """
+    Whether a result image reported by an analysis route is written yet: "pending", "written",
+    "failed" or "unknown". Expects ?path=<path from result_images>.
+    """
+    path = request.args.get('path')
+    if not path:
+        return jsonify({'error': "Missing 'path'"}), 400
+    return jsonify({'path': path, 'status': image_writer.status(path)}), 200
+
+@app.route('/api/image-writer/flush', methods=['POST'])
+def flush_image_writer():
+    """
+    Waits (up to ?timeout= seconds, default 30) until every queued result image is written.
+    """
+    timeout = request.args.get('timeout', 30, type=float)
+    flushed = image_writer.flush(timeout)
+    return jsonify({'flushed': flushed, 'pending': image_writer.pending_count()}), 200 if flushed else 504
+
+@app.route('/api/template-tracking', methods=['GET'])
+def get_template_tracking():
+    """
+    Hit/miss counters of the tracked template search: a hit was found in the window around
+    the last match location, a miss needed a full-frame search.
+    """
+    return jsonify(tracker.stats()), 200
+
+@app.route('/api/template-tracking/reset', methods=['POST'])
+def reset_template_tracking():
+    tracker.reset()
+    return jsonify({'message': 'Template tracking reset'}), 200
+
 def stop_camera_stream(camera_type):
     if camera_type not in globals.cameras:
         raise ValueError(f"Invalid camera type: {camera_type}")
 
     camera = globals.cameras.get(camera_type)
 
-    with globals.grab_locks[camera_type]:
-        if not globals.stream_running.get(camera_type, False):
-            return "Stream already stopped."
+    if not globals.stream_running.get(camera_type, False):
+        return "Stream already stopped."
 
-        try:
-            globals.stream_running[camera_type] = False
+    try:
+        # The acquisition thread takes the grab lock itself, stop it before taking the lock
+        frame_sources[camera_type].stop()
+        app.logger.info(f"{camera_type.capitalize()} stream thread stopped.")
+
+        with globals.grab_locks[camera_type]:
             if camera and camera.IsGrabbing():
                 camera.StopGrabbing()
                 app.logger.info(f"{camera_type.capitalize()} camera stream stopped.")
 
-            if globals.stream_threads.get(camera_type) and globals.stream_threads[camera_type].is_alive():
-                globals.stream_threads[camera_type].join(timeout=2)
-                app.logger.info(f"{camera_type.capitalize()} stream thread stopped.")
-
-            globals.stream_threads[camera_type] = None
-            return f"{camera_type.capitalize()} stream stopped."
-        except Exception as e:
-            raise RuntimeError(f"Failed to stop {camera_type} stream: {str(e)}")
+        return f"{camera_type.capitalize()} stream stopped."
+    except Exception as e:
+        raise RuntimeError(f"Failed to stop {camera_type} stream: {str(e)}")
         
 def connect_camera_internal(camera_type):
     target_serial = CAMERA_IDS.get(camera_type)
@@ -863,20 +936,12 @@ def start_camera_stream_internal(camera_type, scale_factor=0.25):
         app.logger.error(f"{camera_type.capitalize()} camera is not connected or open.")
         return {"error": f"{camera_type.capitalize()} camera not connected"}
 
-    with globals.grab_locks[camera_type]:
-        if globals.stream_running.get(camera_type, False):
-            app.logger.info(f"{camera_type.capitalize()} stream is already running.")
-            return {"message": "Stream already running"}
+    if globals.stream_running.get(camera_type, False):
+        app.logger.info(f"{camera_type.capitalize()} stream is already running.")
+        return {"message": "Stream already running"}
 
-        if not globals.cameras[camera_type].IsGrabbing():
-            app.logger.info(f"{camera_type.capitalize()} camera starting grabbing.")
-            globals.cameras[camera_type].StartGrabbing(pylon.GrabStrategy_LatestImageOnly)
-
-        if not globals.stream_threads.get(camera_type) or not globals.stream_threads[camera_type].is_alive():
-            app.logger.info(f"Starting new thread for {camera_type}")
-            globals.stream_running[camera_type] = True
-        else:
-            app.logger.info(f"{camera_type.capitalize()} stream thread already running.")
+    app.logger.info(f"Starting frame source thread for {camera_type}")
+    frame_sources[camera_type].start()
 
     return {"message": f"{camera_type.capitalize()} video stream started successfully."}
         
@@ -932,6 +997,7 @@ def initialize_serial_devices():
         
 if __name__ == '__main__':      
     load_settings()
+    threading.Thread(target=imageprocessing.warm_homing_banks, name="HomingBankWarmup", daemon=True).start()
     initialize_cameras()
     initialize_serial_devices()
     app.run(debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Analyses whose frame and dots are kept for rendering, the oldest one is dropped first
+ANNOTATION_HISTORY = 16
+# Encoded renders kept in memory, the least recently used are evicted first
+RENDER_CACHE_BYTES = 64 * 1024 * 1024
+
+CLASS_COLORS = {
+    1: (0, 0, 255),    # Red for Class 1
+    2: (0, 255, 255),  # Yellow for Class 2
+    3: (0, 255, 0)     # Green for Class 3
+}
+IMAGE_FORMATS = {"png": ".png", "jpg": ".jpg"}
+
+
+def render_annotation(frame, dots, scale=1.0):
+    """
+    The grayscale frame in color, scaled by `scale`, with a circle of the class color around
+    every dot and its column number next to it.
+
+    Parameters:
+        frame (numpy array): Grayscale image the dot coordinates refer to.
+        dots: Structured array with the fields x, y, col, area and cls (see MEASUREMENT_DTYPE).
+    """
+    if scale != 1:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    annotated = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+    xs = (dots['x'] * scale).astype(np.int64).tolist()
+    ys = (dots['y'] * scale).astype(np.int64).tolist()
+    radii = np.maximum(1, (np.sqrt(dots['area'] / np.pi) * scale).astype(np.int64)).tolist()
+    font_scale = max(0.25, 0.4 * scale)
+    for x, y, radius, col, cls in zip(xs, ys, radii, dots['col'].tolist(), dots['cls'].tolist()):
+        cv2.circle(annotated, (x, y), radius, CLASS_COLORS.get(cls, (255, 255, 255)), 1)
+        cv2.putText(annotated, str(col), (x + radius + 2, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                    (255, 255, 255), 1)
+    return annotated
+
+
+class AnnotationCache:
+    """
+    Keeps the raw frame and the classified dots of the last analyses and renders their
+    annotated image only when somebody asks for it.
+
+    Renders are encoded once per (analysis, scale, format) and cached, the cache is bounded by
+    the total size of the encoded images with least recently used eviction. The frames are
+    kept by reference, they must not be modified after they were recorded.
+    """
+    def __init__(self, history=ANNOTATION_HISTORY, cache_bytes=RENDER_CACHE_BYTES):
+        self.history = history
+        self.cache_bytes = cache_bytes
+        self._lock = threading.Lock()
+        self._analyses = OrderedDict()  # analysis_id -> {"label", "frame", "dots", "time"}
+        self._renders = OrderedDict()  # (analysis_id, scale, format) -> encoded image bytes
+        self._render_bytes = 0
+        self._next_id = 1
+        self._hits = 0
+        self._misses = 0
+
+    def record(self, label, frame, dots):
+        """
+        Keeps the frame and dots of an analysis. Returns its analysis id.
+        """
+        with self._lock:
+            analysis_id = str(self._next_id)
+            self._next_id += 1
+            self._analyses[analysis_id] = {"label": label, "frame": frame, "dots": dots, "time": time.time()}
+            while len(self._analyses) > self.history:
+                dropped, _ = self._analyses.popitem(last=False)
+                self._evict(lambda key: key[0] == dropped)
+            return analysis_id
+
+    def _evict(self, matches):
+        for key in [key for key in self._renders if matches(key)]:
+            self._render_bytes -= len(self._renders.pop(key))
+
+    def render(self, analysis_id, scale=1.0, image_format="png"):
+        """
+        The encoded annotated image of an analysis, None if the analysis is not kept (anymore).
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format '{image_format}'.")
+        if not 0 < scale <= 1:
+            raise ValueError("The scale must be in (0, 1].")
+
+        key = (analysis_id, scale, image_format)
+        with self._lock:
+            encoded = self._renders.get(key)
+            if encoded is not None:
+                self._renders.move_to_end(key)
+                self._hits += 1
+                return encoded
+            analysis = self._analyses.get(analysis_id)
+            if analysis is None:
+                return None
+            self._misses += 1
+
+        # Render outside the lock, two concurrent first requests only render twice
+        annotated = render_annotation(analysis["frame"], analysis["dots"], scale)
+        ok, buffer = cv2.imencode(IMAGE_FORMATS[image_format], annotated)
+        if not ok:
+            raise RuntimeError(f"Failed to encode the annotation of analysis {analysis_id}.")
+        encoded = buffer.tobytes()
+
+        with self._lock:
+            if analysis_id in self._analyses and len(encoded) <= self.cache_bytes and key not in self._renders:
+                self._renders[key] = encoded
+                self._render_bytes += len(encoded)
+                while self._render_bytes > self.cache_bytes:
+                    _, evicted = self._renders.popitem(last=False)
+                    self._render_bytes -= len(evicted)
+        return encoded
+
+    def analyses(self):
+        """
+        The kept analyses, oldest first: id, label, dot count and time.
+        """
+        with self._lock:
+            return [{"analysis_id": analysis_id, "label": analysis["label"], "dot_count": len(analysis["dots"]),
+                     "time": analysis["time"]}
+                    for analysis_id, analysis in self._analyses.items()]
+
+    def stats(self):
+        with self._lock:
+            return {"analyses": len(self._analyses), "renders": len(self._renders),
+                    "render_bytes": self._render_bytes, "cache_bytes": self.cache_bytes,
+                    "hits": self._hits, "misses": self._misses}
+
+
+# Process-wide annotation cache of the analysis routes
+annotations = AnnotationCache()
@@ -0,0 +1,66 @@
+"""
+Benchmark of the slice dot centers: the per-dot cv2.minEnclosingCircle centers the slice pipelines
+used to place their dots at, against the vectorized contour centroids, on synthetic side slice dot
+fields. Checks the extracted dots agree: same areas, integer positions at most 1 px apart and the
+same traced columns.
+
+    python benchmarks/bench_blob_centers.py
+"""
+import os
+import sys
+import timeit
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from blob_extractor import extract_blobs  # noqa: E402
+from column_index import trace_columns  # noqa: E402
+
+
+def make_field(seed=0, column_spacing=34, row_spacing=22):
+    """
+    A slice-like field of round, anti-aliased dots of 1.5 to 7 px radius, 5% of them missing.
+    """
+    rng = np.random.default_rng(seed)
+    image = np.zeros((1400, 3000), np.uint8)
+    for cx in range(100, 2900, column_spacing):
+        for cy in range(80, 1320, row_spacing):
+            if rng.random() < 0.05:
+                continue
+            center = (int(cx + rng.normal(0, 2)), int(cy + rng.normal(0, 1)))
+            cv2.circle(image, center, int(round(rng.uniform(1.5, 7))), int(rng.integers(120, 255)), -1,
+                       lineType=cv2.LINE_AA)
+    return cv2.GaussianBlur(image, (3, 3), 0.7)
+
+
+def dots(image, center_mode):
+    blobs = extract_blobs(image, min_area=1, mode="contour", center_mode=center_mode)
+    return blobs.centers.astype(np.int32), blobs.areas
+
+
+def columns(centers):
+    return {frozenset(column) for column in trace_columns(centers[:, 0], centers[:, 1])}
+
+
+def main(fields=5, repeats=5):
+    image = make_field()
+    circle_seconds = min(timeit.repeat(lambda: dots(image, "enclosing_circle"), number=1, repeat=repeats))
+    centroid_seconds = min(timeit.repeat(lambda: dots(image, "centroid"), number=1, repeat=repeats))
+    print(f"{'circle':>10}: {circle_seconds * 1000:8.2f} ms")
+    print(f"{'centroid':>10}: {centroid_seconds * 1000:8.2f} ms")
+
+    for seed in range(fields):
+        image = make_field(seed)
+        circle_centers, circle_areas = dots(image, "enclosing_circle")
+        centroid_centers, centroid_areas = dots(image, "centroid")
+        # Both modes keep the same contours in the same order, the dots compare index by index
+        offset = np.abs(circle_centers - centroid_centers).max(axis=1)
+        print(f"field {seed}: {len(circle_areas)} dots, identical areas: "
+              f"{np.array_equal(circle_areas, centroid_areas)}, identical positions: "
+              f"{(offset == 0).mean() * 100:.1f}%, max offset: {offset.max()} px, identical columns: "
+              f"{columns(circle_centers) == columns(centroid_centers)}")
+
+
+if __name__ == "__main__":
+    main()
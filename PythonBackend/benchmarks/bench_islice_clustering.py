@@ -0,0 +1,56 @@
+"""
+Benchmark of the inner slice column clustering: the legacy per-column rescans against the
+vectorized path, on a synthetic 510-dot slice with two missing columns.
+
+    python benchmarks/bench_islice_clustering.py
+"""
+import contextlib
+import io
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import imageprocessing  # noqa: E402
+
+
+def make_slice(dot_count=510, spacing=55, seed=0):
+    """
+    Dots of a wedge-shaped inner slice, sorted like islice_detect_small_dots_and_contours sorts them.
+    """
+    rng = np.random.default_rng(seed)
+    dots = []
+    column = 0
+    while len(dots) < dot_count:
+        column += 1
+        if column in (9, 23):  # Missing columns
+            continue
+        x = 2850 - column * spacing
+        for row in range(2 + column // 3):
+            dots.append((x + rng.integers(-4, 5), 60 + row * 50 + rng.integers(-3, 4)))
+    dot_centers = np.array(dots[:dot_count], dtype=np.int32)
+    dot_areas = rng.uniform(10, 40, len(dot_centers))
+    order = np.lexsort((-dot_centers[:, 1], -dot_centers[:, 0]))
+    return dot_centers[order], dot_areas[order]
+
+
+def main(repeats=20):
+    dot_centers, dot_areas = make_slice()
+    results = {}
+    for name, cluster in (("legacy", imageprocessing._islice_cluster_columns_legacy),
+                          ("vectorized", imageprocessing._islice_cluster_columns)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = cluster(dot_centers, dot_areas, 40)
+            seconds = min(timeit.repeat(lambda: cluster(dot_centers, dot_areas, 40), number=1, repeat=repeats))
+        print(f"{name:>10}: {seconds * 1000:8.2f} ms")
+        results[name + "_time"] = seconds
+
+    same = results["legacy"][0] == results["vectorized"][0] and results["legacy"][1:] == results["vectorized"][1:]
+    print(f"{len(dot_centers)} dots, identical output: {same}, "
+          f"speedup: {results['legacy_time'] / results['vectorized_time']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
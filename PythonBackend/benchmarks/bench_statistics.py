@@ -0,0 +1,75 @@
+"""
+Benchmark of the dot classification: the per-dot loop calculate_statistics used to run against
+the NumPy kernel statistics_processor.classify_dots, on a synthetic 100k-dot session.
+
+    python benchmarks/bench_statistics.py
+"""
+import os
+import sys
+import timeit
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import statistics_processor  # noqa: E402
+
+
+def make_session(dot_count=100_000, seed=0):
+    rng = np.random.default_rng(seed)
+    dot_ids = np.arange(1, dot_count + 1)
+    cols = rng.integers(-1, 130, dot_count)
+    areas = rng.integers(0, 400, dot_count) / 2.0
+    return dot_ids, cols, areas
+
+
+def classify_loop(data):
+    """
+    The classification loop of the original calculate_statistics, data = [(dot_id, col, area), ...].
+    """
+    columns = defaultdict(list)
+    for dot_id, col, area in data:
+        columns[col].append((dot_id, col, area))
+
+    column_averages = {}
+    if 0 in columns:
+        column_averages[0] = np.mean([d[2] for d in columns[0]])
+    for c in range(11, 128):
+        if c in columns:
+            column_averages[c] = np.mean([d[2] for d in columns[c]])
+
+    class_counts = {1: 0, 2: 0, 3: 0}
+    classified = []
+    for col_val, dots_in_col in columns.items():
+        avg_area = column_averages.get(col_val, 1.0)
+        for dot_id, col, area in dots_in_col:
+            ratio = (area / avg_area) if avg_area > 0 else 1
+            cls = 1 if ratio < 0.1 else 2 if ratio <= 0.9 else 3
+            class_counts[cls] += 1
+            classified.append((dot_id, cls))
+    classified.sort()
+    class1_ids = {dot_id for dot_id, cls in classified if cls == 1}
+    return class_counts, classified, class1_ids
+
+
+def main(repeats=5):
+    dot_ids, cols, areas = make_session()
+    data = list(zip(dot_ids.tolist(), cols.tolist(), areas.tolist()))
+
+    loop_counts, loop_classified, loop_class1 = classify_loop(data)
+    classes, class_counts, class1_ids = statistics_processor.classify_dots(dot_ids, cols, areas)
+
+    loop_seconds = min(timeit.repeat(lambda: classify_loop(data), number=1, repeat=repeats))
+    kernel_seconds = min(timeit.repeat(lambda: statistics_processor.classify_dots(dot_ids, cols, areas),
+                                       number=1, repeat=repeats * 4))
+    print(f"{'loop':>10}: {loop_seconds * 1000:8.2f} ms")
+    print(f"{'kernel':>10}: {kernel_seconds * 1000:8.2f} ms")
+
+    same = (list(loop_counts.values()) == class_counts.tolist()
+            and [cls for _, cls in loop_classified] == classes.tolist()
+            and loop_class1 == set(class1_ids.tolist()))
+    print(f"{len(dot_ids)} dots, identical classes: {same}, speedup: {loop_seconds / kernel_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import json
+import os
+import logging
+import threading
+import atexit
+
+DEFAULT_CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calibration.json')
+
+# Changes are written this many seconds after the last one, so a burst of updates is one write
+SAVE_DELAY = 2.0
+
+
+class CalibrationStore:
+    """
+    Per-camera calibration values (e.g. x_end of the main camera), kept in memory.
+
+    A value that actually changes is persisted to a small JSON file, debounced by SAVE_DELAY
+    seconds and written atomically (temporary file + rename), so readers on the analysis
+    hot path never wait for the disk.
+    """
+    def __init__(self, path=DEFAULT_CALIBRATION_PATH, save_delay=SAVE_DELAY):
+        self.path = path
+        self.save_delay = save_delay
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # Keeps concurrent flushes from writing out of order
+        self._values = {}  # camera -> {key: value}
+        self._dirty = False
+        self._timer = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                values = json.load(file)
+            if isinstance(values, dict):
+                self._values = {camera: dict(entries) for camera, entries in values.items()
+                                if isinstance(entries, dict)}
+            logging.info(f"Calibration loaded from {self.path}")
+        except FileNotFoundError:
+            self._values = {}
+        except (json.JSONDecodeError, OSError) as e:
+            logging.error(f"Failed to load calibration from {self.path}: {e}")
+            self._values = {}
+
+    def get(self, camera, key, default=None):
+        with self._lock:
+            return self._values.get(camera, {}).get(key, default)
+
+    def set(self, camera, key, value):
+        """
+        Sets a calibration value. Returns True if it changed (and a save was scheduled).
+        """
+        with self._lock:
+            entries = self._values.setdefault(camera, {})
+            if key in entries and entries[key] == value:
+                return False
+            entries[key] = value
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.save_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return True
+
+    def snapshot(self):
+        with self._lock:
+            return {camera: dict(entries) for camera, entries in self._values.items()}
+
+    def flush(self):
+        """
+        Writes pending changes now.
+        """
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                values = {camera: dict(entries) for camera, entries in self._values.items()}
+                self._dirty = False
+
+            tmp_path = self.path + '.tmp'
+            try:
+                with open(tmp_path, 'w') as file:
+                    json.dump(values, file, indent=4)
+                os.replace(tmp_path, self.path)
+                logging.info(f"Calibration saved to {self.path}")
+            except OSError as e:
+                logging.error(f"Failed to save calibration to {self.path}: {e}")
+                with self._lock:
+                    self._dirty = True
+
+
+# Process-wide calibration store
+calibration = CalibrationStore()
+atexit.register(calibration.flush)
@@ -10,7 +10,8 @@ from queue import Queue, Empty  # Import Empty from queue module
 import time
 import requests
 import json
-from globals import app, stream_running, stream_threads, cameras
+from globals import app, stream_running, cameras
+from frame_source import frame_sources
 import threading
 
 
@@ -35,32 +36,6 @@ def parse_args() -> Optional[str]:
     return None if argc == 0 else args[0]
 
 
-# Function to continuously generate and send frames
-def stream_video(camera_type, scale_factor):
-    camera = cameras.get(camera_type)
-    if not camera or not camera.IsOpen():
-        app.logger.error(f"{camera_type.capitalize()} camera is not open.")
-        return
-
-    app.logger.info(f"{camera_type.capitalize()} camera streaming thread started with scale factor {scale_factor}.")
-    stream_running[camera_type] = True
-
-    try:
-        while stream_running[camera_type]:
-            grab_result = camera.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
-            if grab_result.GrabSucceeded():
-                image = grab_result.Array  # No scaling here
-                _, frame = cv2.imencode('.jpg', image)
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame.tobytes() + b'\r\n')
-            grab_result.Release()
-    except Exception as e:
-        app.logger.error(f"Error in {camera_type} video stream: {e}")
-    finally:
-        stream_running[camera_type] = False
-        app.logger.info(f"{camera_type.capitalize()} camera streaming thread stopped.")
-        
-
 def get_camera(camera_id: str) -> pylon.InstantCamera:
     factory = pylon.TlFactory.GetInstance()
     devices = factory.EnumerateDevices()
@@ -114,23 +89,6 @@ def setup_pixel_format(camera: pylon.InstantCamera):
     if camera.PixelFormat.GetValue() != opencv_display_format:
         camera.PixelFormat.SetValue(opencv_display_format)
         
-def start_streaming(camera: pylon.InstantCamera):
-    handler = Handler()
-    try:
-        camera.StartGrabbing(pylon.GrabStrategy_LatestImageOnly)
-        while camera.IsGrabbing():
-            grab_result = camera.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
-            if grab_result.GrabSucceeded():
-                image = grab_result.Array
-                cv2.imshow("Stream", image)
-                if cv2.waitKey(1) == 13:  # Enter key
-                    break
-                handler.save_frame(image)
-            grab_result.Release()
-    finally:
-        camera.StopGrabbing()
-        camera.Close()
-        
 def stop_streaming(camera: pylon.InstantCamera):
     if camera.IsGrabbing():
         camera.StopGrabbing()
@@ -138,49 +96,6 @@ def stop_streaming(camera: pylon.InstantCamera):
     else:
         app.logger.info(f"Camera {camera.GetDeviceInfo().GetSerialNumber()} is not currently streaming.")
 
-class Handler:
-    def __init__(self, folder_selected):
-        self.display_queue = Queue(10)
-        self.save_next_frame = False
-        self.folder_selected = folder_selected
-        self.saved_image_path = None
-
-    def get_image(self):
-        try:
-            return self.display_queue.get(timeout=1)
-        except Empty: 
-            return None
-
-    def set_save_next_frame(self):
-        self.save_next_frame = True
-
-    def get_latest_image_name(self):
-        return self.saved_image_path
-
-    def save_frame(self, frame):
-        frame_np = frame.as_opencv_image()
-        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        filename = os.path.join(self.folder_selected, f"IMG_{timestamp}.jpg")
-        cv2.imwrite(filename, frame_np)
-        self.saved_image_path = f"IMG_{timestamp}.jpg"
-        print("Image saved as:", filename)
-
-    def __call__(self, cam: pylon.InstantCamera, stream, frame: pylon.GrabResult):
-        if frame.GrabSucceeded():
-            print('{} acquired {}'.format(cam, frame), flush=True)
-            if frame.get_pixel_format() == opencv_display_format:
-                display = frame
-            else:
-                display = frame.convert_pixel_format(opencv_display_format)
-            self.display_queue.put(display.as_opencv_image(), True)
-
-            if self.save_next_frame:
-                self.save_frame(frame)
-                self.save_next_frame = False
-
-            cam.queue_frame(frame)
-            return frame  
-
 def get_camera_properties(camera: pylon.InstantCamera) -> dict:
     properties = {}
     try:
@@ -256,17 +171,13 @@ def validate_and_set_camera_param(camera, param_name: str, param_value: float, p
         was_streaming = stream_running[camera_type] 
         
         if param_name in ['Width', 'Height'] and was_streaming:
-            stream_running[camera_type] = False
+            frame_sources[camera_type].stop()
+            app.logger.info(f"{camera_type.capitalize()} stream thread joined.")
 
             if camera.IsGrabbing():
                 camera.StopGrabbing()
                 app.logger.info(f"{camera_type.capitalize()} stream stopped to apply {param_name} change.")
 
-            if stream_threads.get(camera_type) and stream_threads[camera_type].is_alive():
-                stream_threads[camera_type].join(timeout=2)
-                app.logger.info(f"{camera_type.capitalize()} stream thread joined.")
-
-            stream_threads[camera_type] = None
             time.sleep(0.5)  # Short pause to ensure the camera is ready
 
         if not camera.IsOpen():
@@ -297,9 +208,7 @@ def validate_and_set_camera_param(camera, param_name: str, param_value: float, p
         app.logger.info(f" {camera_type.capitalize()} camera {param_name} set to {valid_value}")
 
         if param_name in ['Width', 'Height'] and was_streaming:
-            stream_running[camera_type] = True
-            stream_threads[camera_type] = threading.Thread(target=stream_video, args=(camera_type, 1.0))
-            stream_threads[camera_type].start()
+            frame_sources[camera_type].start()
             app.logger.info(f"🔄 {camera_type.capitalize()} stream restarted after {param_name} change.")
 
     except Exception as e:
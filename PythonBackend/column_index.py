@@ -0,0 +1,153 @@
+from bisect import bisect_right
+
+import numpy as np
+
+# Widest X window a column step may use, the grid cells are this wide
+MAX_SEPARATION = 60
+MIN_SEPARATION = 15
+# A column never continues further down than this
+MAX_STEP_Y = 3000
+
+
+def _find_alive(next_alive, k):
+    """
+    First alive position >= k in a next-alive pointer list (with path compression).
+    """
+    root = k
+    while next_alive[root] != root:
+        root = next_alive[root]
+    while next_alive[k] != root:
+        next_alive[k], k = root, next_alive[k]
+    return root
+
+
+class ColumnIndex:
+    """
+    Grid bucket index of dot centers for tracing columns from the top down.
+
+    The dots are ordered by Y, then X. They are bucketed by X into cells MAX_SEPARATION wide,
+    every bucket keeps that order, so "the nearest dot below within an X window" only looks at
+    the first alive dots of at most three buckets. Removed dots are skipped with next-alive
+    pointers, so removal is O(1) amortized.
+    """
+    def __init__(self, xs, ys, cell_width=MAX_SEPARATION):
+        xs = np.asarray(xs)
+        ys = np.asarray(ys)
+        self.cell_width = cell_width
+        self._count = len(xs)
+
+        # Position = rank in (Y, X) order, ties keep the input order
+        order = np.lexsort((xs, ys))
+        self._ids = order.tolist()
+        self._x = xs[order].tolist()
+        self._y = ys[order].tolist()
+        self._next = list(range(self._count + 1))
+
+        # Buckets of positions, in (Y, X) order
+        cells = (xs[order] // cell_width).tolist()
+        self._buckets = {}
+        self._bucket_slot = [0] * self._count
+        for position, cell in enumerate(cells):
+            bucket = self._buckets.setdefault(cell, ([], [], []))
+            self._bucket_slot[position] = len(bucket[0])
+            bucket[0].append(position)
+            bucket[1].append(self._y[position])
+        for positions, _, next_alive in self._buckets.values():
+            next_alive.extend(range(len(positions) + 1))
+        self._cells = cells
+
+        # Alive flags in X order, for the column separation of the remaining dots
+        self._x_order = np.argsort(xs, kind='stable')
+        self._x_sorted = xs[self._x_order]
+        self._x_rank = np.empty(self._count, dtype=np.int64)
+        self._x_rank[self._x_order] = np.arange(self._count)
+        self._alive_by_x = np.ones(self._count, dtype=bool)
+
+    def __len__(self):
+        return self._count
+
+    def remove(self, position):
+        self._next[position] = position + 1
+        _, _, next_alive = self._buckets[self._cells[position]]
+        slot = self._bucket_slot[position]
+        next_alive[slot] = slot + 1
+        self._alive_by_x[self._x_rank[self._ids[position]]] = False
+        self._count -= 1
+
+    def first(self):
+        """
+        Position of the topmost (then leftmost) remaining dot, None if none is left.
+        """
+        position = _find_alive(self._next, 0)
+        return position if position < len(self._ids) else None
+
+    def separation(self):
+        """
+        X window of a column step: twice the median positive X gap of the remaining dots,
+        clamped to [MIN_SEPARATION, MAX_SEPARATION].
+        """
+        x_values = self._x_sorted[self._alive_by_x]
+        if len(x_values) < 2:
+            return 30  # Fallback value
+        x_diffs = np.diff(x_values)
+        x_diffs = x_diffs[x_diffs > 0]  # Ignore zero gaps
+        if len(x_diffs) == 0:
+            return MIN_SEPARATION
+        return max(MIN_SEPARATION, min(np.median(x_diffs) * 2, MAX_SEPARATION))
+
+    def next_below(self, position, separation):
+        """
+        Position of the remaining dot closest below `position` (smallest Y step, then smallest
+        X) within +/- separation in X and at most MAX_STEP_Y below, None if there is none.
+        """
+        last_x, last_y = self._x[position], self._y[position]
+        x_min, x_max = last_x - separation, last_x + separation
+        best = None
+        for cell in range(int(x_min // self.cell_width), int(x_max // self.cell_width) + 1):
+            bucket = self._buckets.get(cell)
+            if bucket is None:
+                continue
+            positions, bucket_y, next_alive = bucket
+            slot = _find_alive(next_alive, bisect_right(bucket_y, last_y))
+            while slot < len(positions):
+                candidate = positions[slot]
+                if best is not None and candidate > best:
+                    break
+                if bucket_y[slot] - last_y > MAX_STEP_Y:
+                    break
+                if x_min <= self._x[candidate] <= x_max:
+                    best = candidate
+                    break
+                slot = _find_alive(next_alive, slot + 1)
+        return best
+
+    def trace_columns(self):
+        """
+        Splits all remaining dots into columns. Every column starts at the topmost remaining dot
+        and repeatedly continues with the nearest dot below it (see next_below), the X window is
+        computed from the dots remaining when the column starts.
+
+        Returns:
+            list of lists: the input indices of the dots of every column, top to bottom.
+        """
+        columns = []
+        while self._count > 0:
+            separation = self.separation()
+            position = self.first()
+            self.remove(position)
+            column = [position]
+            while True:
+                position = self.next_below(position, separation)
+                if position is None:
+                    break
+                self.remove(position)
+                column.append(position)
+            columns.append([self._ids[position] for position in column])
+        return columns
+
+
+def trace_columns(xs, ys):
+    """
+    The columns of the dots at (xs, ys), see ColumnIndex.trace_columns.
+    """
+    return ColumnIndex(xs, ys).trace_columns()
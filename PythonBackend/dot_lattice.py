@@ -0,0 +1,119 @@
+import numpy as np
+
+# Column rotations searched by fit_column_lattice, in degrees
+LATTICE_MAX_ANGLE = 2.0
+# A fit is only accepted when the dots lie this close to their lattice column (fraction of the spacing)
+LATTICE_MAX_RESIDUAL = 0.25
+
+
+class ColumnLattice:
+    """
+    A regular grid of dot columns: the columns are straight lines rotated by `angle` degrees
+    from vertical, `spacing` px apart, column k passes through x' = phase + k * spacing in the
+    rotated frame (x' = x cos + y sin). Dots within a column are `row_pitch` px apart.
+    """
+    def __init__(self, angle, spacing, phase, row_pitch, quality):
+        self.angle = angle
+        self.spacing = spacing
+        self.phase = phase
+        self.row_pitch = row_pitch
+        self.quality = quality  # Mean resultant length of the column phases, 1 is a perfect grid
+
+    def rotate(self, xs, ys):
+        """
+        (x', y') of image points in the lattice frame, x' across and y' along the columns.
+        """
+        theta = np.deg2rad(self.angle)
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        return xs * np.cos(theta) + ys * np.sin(theta), -xs * np.sin(theta) + ys * np.cos(theta)
+
+    def unrotate(self, us, vs):
+        """
+        Image (x, y) of lattice frame points.
+        """
+        theta = np.deg2rad(self.angle)
+        us = np.asarray(us, dtype=np.float64)
+        vs = np.asarray(vs, dtype=np.float64)
+        return us * np.cos(theta) - vs * np.sin(theta), us * np.sin(theta) + vs * np.cos(theta)
+
+    def columns(self, xs, ys):
+        """
+        Lattice column index of every point and its offset from the column line (px).
+        """
+        us, _ = self.rotate(xs, ys)
+        columns = np.round((us - self.phase) / self.spacing).astype(np.int64)
+        return columns, us - self.phase - columns * self.spacing
+
+
+def _resultant(us, spacings):
+    """
+    Mean resultant vector of the phases of `us` for every candidate spacing.
+    """
+    phases = np.exp(2j * np.pi * us[None, :] / spacings[:, None])
+    return phases.mean(axis=1)
+
+
+def fit_column_lattice(xs, ys, min_spacing, max_angle=LATTICE_MAX_ANGLE, max_residual=LATTICE_MAX_RESIDUAL):
+    """
+    Fits a ColumnLattice to dot centers.
+
+    The spacing is estimated from the gaps wider than `min_spacing` (the gaps between columns,
+    the spacing is never below it), then spacing and rotation are refined together by
+    maximizing how well the dot phases agree, coarse to fine. The row pitch is the median step
+    between consecutive dots of the same column.
+
+    Returns:
+        ColumnLattice, or None if the dots do not form a regular grid.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if len(xs) < 4:
+        return None
+
+    def column_spacing(us):
+        # Median of the gaps between columns: the gaps wider than min_spacing
+        gaps = np.diff(np.sort(us))
+        gaps = gaps[gaps > min_spacing]
+        return float(np.median(gaps)) if len(gaps) else None
+
+    # Coarse to fine search over (angle, spacing). On the coarse level every angle gets its own
+    # spacing estimate, a rotation smears the columns and shrinks the gaps between them. The
+    # finer levels refine around the best pair of the level before.
+    quality, angle, spacing = -1.0, 0.0, None
+    for angle_step, angle_span, spacing_span in ((0.25, max_angle, 0.1), (0.025, 0.25, 0.02), (0.0025, 0.025, 0.004)):
+        center_angle, center_spacing = angle, spacing
+        for candidate_angle in center_angle + np.arange(-angle_span, angle_span + angle_step / 2, angle_step):
+            theta = np.deg2rad(candidate_angle)
+            us = xs * np.cos(theta) + ys * np.sin(theta)
+            candidate_spacing = center_spacing if center_spacing is not None else column_spacing(us)
+            if candidate_spacing is None:
+                continue
+            spacings = candidate_spacing * (1 + np.linspace(-spacing_span, spacing_span, 41))
+            spacings = spacings[spacings > min_spacing]
+            if len(spacings) == 0:
+                continue
+            strengths = np.abs(_resultant(us, spacings))
+            i = int(np.argmax(strengths))
+            if strengths[i] > quality:
+                quality, angle, spacing = float(strengths[i]), float(candidate_angle), float(spacings[i])
+        if spacing is None:
+            return None
+
+    theta = np.deg2rad(angle)
+    us = xs * np.cos(theta) + ys * np.sin(theta)
+    phase = float(np.angle(_resultant(us, np.array([spacing]))[0]) * spacing / (2 * np.pi))
+    lattice = ColumnLattice(angle, spacing, phase, None, quality)
+
+    columns, residuals = lattice.columns(xs, ys)
+    if np.max(np.abs(residuals)) > max_residual * spacing:
+        return None
+
+    # Row pitch: median step between consecutive dots of a column
+    _, vs = lattice.rotate(xs, ys)
+    order = np.lexsort((vs, columns))
+    steps = np.diff(vs[order])
+    same_column = np.diff(columns[order]) == 0
+    steps = steps[same_column & (steps > 0)]
+    lattice.row_pitch = float(np.median(steps)) if len(steps) else None
+    return lattice
@@ -0,0 +1,265 @@
+import cv2
+import numpy as np
+import os
+import logging
+import threading
+
+# Recorded reference dot maps live next to the backend
+DOT_MAP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dot_maps')
+
+# Rematch / refit rounds of the frame registration
+REGISTRATION_ITERATIONS = 3
+# RANSAC reprojection threshold of the affine fit, px
+REGISTRATION_RANSAC_THRESHOLD = 3.0
+# A registration is rejected when fewer of the expected dots than this were matched
+REGISTRATION_MIN_MATCHED = 0.5
+
+
+class DotMap:
+    """
+    The expected dots of one region (center circle, center slice or outer slice) of a product
+    as seen by one camera, recorded from a good tablet:
+        points (N, 2) float64: x, y of every expected dot in region coordinates
+        columns (N,) int64: the column label every dot is reported with
+        areas (N,) float64: the areas measured when the map was recorded
+        radius (float): half the distance to the nearest neighbour dot, a frame dot further
+            than this from an expected position does not belong to it
+
+    Expected dots are looked up through a raster of the region where every pixel holds the
+    index of the nearest expected dot (or -1 further than `radius`), so matching all dots of
+    a frame is one fancy-indexing step.
+    """
+    def __init__(self, points, columns, areas, radius=None):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.columns = np.asarray(columns, dtype=np.int64)
+        self.areas = np.asarray(areas, dtype=np.float64)
+        if radius is None:
+            radius = _nearest_neighbour_distance(self.points) / 2
+        self.radius = float(radius)
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.points)
+
+    def _lookup_raster(self):
+        with self._index_lock:
+            if self._index is None:
+                self._index = _build_index(self.points, self.radius)
+            return self._index
+
+    def lookup(self, xs, ys):
+        """
+        Index of the expected dot at every (x, y), -1 where there is none within the radius.
+        """
+        index = self._lookup_raster()
+        xs = np.rint(np.asarray(xs, dtype=np.float64)).astype(np.int64)
+        ys = np.rint(np.asarray(ys, dtype=np.float64)).astype(np.int64)
+        inside = (xs >= 0) & (ys >= 0) & (xs < index.shape[1]) & (ys < index.shape[0])
+        indices = np.full(len(xs), -1, dtype=np.int64)
+        indices[inside] = index[ys[inside], xs[inside]]
+        return indices
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, points=self.points, columns=self.columns, areas=self.areas,
+                     radius=np.array(self.radius))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['points'], data['columns'], data['areas'], float(data['radius']))
+
+    @classmethod
+    def from_dots(cls, dots):
+        """
+        DotMap of a measured dot list [[x, y, col, area], ...]. Only measured dots become expected
+        positions: the placeholder rows of missing columns (y = -1) and inferred dots (area 0)
+        are left out.
+        """
+        dots = np.asarray(dots, dtype=np.float64).reshape(-1, 4)
+        dots = dots[(dots[:, 1] >= 0) & (dots[:, 3] > 0)]
+        return cls(dots[:, :2], dots[:, 2].astype(np.int64), dots[:, 3])
+
+
+def _nearest_neighbour_distance(points):
+    """
+    Smallest distance between two distinct points. Only the next few dots in X and in Y order
+    are compared, on a dot grid the nearest neighbour is always among them.
+    """
+    if len(points) < 2:
+        return 10.0
+    best = np.inf
+    for axis in (0, 1):
+        ordered = points[np.lexsort((points[:, 1 - axis], points[:, axis]))]
+        for shift in range(1, min(8, len(points))):
+            distances = np.hypot(*(ordered[shift:] - ordered[:-shift]).T)
+            distances = distances[distances > 0]
+            if len(distances):
+                best = min(best, float(distances.min()))
+    return best if np.isfinite(best) else 10.0
+
+
+def _build_index(points, radius):
+    """
+    Raster of the nearest expected dot index within `radius` (see DotMap).
+    """
+    margin = int(np.ceil(radius)) + 1
+    width = int(np.ceil(points[:, 0].max())) + margin + 1
+    height = int(np.ceil(points[:, 1].max())) + margin + 1
+    seeds = np.full((height, width), 255, dtype=np.uint8)
+    px = np.clip(np.rint(points[:, 0]).astype(np.int64), 0, width - 1)
+    py = np.clip(np.rint(points[:, 1]).astype(np.int64), 0, height - 1)
+    seeds[py, px] = 0
+
+    # Every pixel gets the label of its nearest seed pixel, labels are numbered per seed pixel
+    distances, labels = cv2.distanceTransformWithLabels(seeds, cv2.DIST_L2, 5,
+                                                        labelType=cv2.DIST_LABEL_PIXEL)
+    label_to_point = np.full(int(labels.max()) + 1, -1, dtype=np.int32)
+    label_to_point[labels[py, px]] = np.arange(len(points), dtype=np.int32)
+    index = label_to_point[labels]
+    index[distances > radius] = -1
+    index.setflags(write=False)
+    return index
+
+
+def _apply_affine(matrix, xs, ys):
+    return (matrix[0, 0] * xs + matrix[0, 1] * ys + matrix[0, 2],
+            matrix[1, 0] * xs + matrix[1, 1] * ys + matrix[1, 2])
+
+
+def register_dots(dot_map, xs, ys, iterations=REGISTRATION_ITERATIONS,
+                  ransac_threshold=REGISTRATION_RANSAC_THRESHOLD, min_matched=REGISTRATION_MIN_MATCHED):
+    """
+    Affine transform from the dot map into the frame, fitted to the frame dots at (xs, ys).
+
+    The regions are template matched before, so the frame starts out close to the map: the
+    frame dots are matched to the expected dots through the lookup raster, one RANSAC affine
+    fit is made, and the matching is repeated with the refined transform.
+
+    Returns:
+        2x3 float64 matrix, or None if too few dots matched.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    matrix = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    if len(xs) < 3:
+        return None
+
+    for _ in range(iterations):
+        inverse = cv2.invertAffineTransform(matrix)
+        indices = dot_map.lookup(*_apply_affine(inverse, xs, ys))
+        matched = indices >= 0
+        if matched.sum() < max(3, min_matched * len(dot_map)):
+            return None
+        source = dot_map.points[indices[matched]]
+        target = np.column_stack((xs[matched], ys[matched]))
+        fitted, _ = cv2.estimateAffine2D(source, target, method=cv2.RANSAC,
+                                         ransacReprojThreshold=ransac_threshold)
+        if fitted is None:
+            return None
+        matrix = fitted
+    return matrix
+
+
+def measure_dots(dot_map, centers, areas, matrix):
+    """
+    The measured dot of every expected position, in the map order.
+
+    Every frame dot is assigned to the expected dot it lands on, when several land on the same
+    one the closest wins. Expected dots without a frame dot are missing and reported at their
+    expected position with area 0.
+
+    Returns:
+        list of (x, y, col, area) tuples, one per expected dot.
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    areas = np.asarray(areas, dtype=np.float64)
+    expected_x, expected_y = _apply_affine(matrix, dot_map.points[:, 0], dot_map.points[:, 1])
+
+    result_x = expected_x.astype(np.int64)
+    result_y = expected_y.astype(np.int64)
+    result_area = np.zeros(len(dot_map))
+
+    if len(centers):
+        inverse = cv2.invertAffineTransform(matrix)
+        indices = dot_map.lookup(*_apply_affine(inverse, centers[:, 0], centers[:, 1]))
+        matched = np.flatnonzero(indices >= 0)
+        targets = indices[matched]
+        distances = np.hypot(centers[matched, 0] - expected_x[targets], centers[matched, 1] - expected_y[targets])
+        # Closest frame dot first for every expected dot, then keep the first of each
+        order = np.lexsort((distances, targets))
+        first = np.concatenate(([True], targets[order][1:] != targets[order][:-1])) if len(order) else order
+        winners = matched[order][first]
+        winner_targets = targets[order][first]
+        result_x[winner_targets] = centers[winners, 0].astype(np.int64)  # Truncates like int()
+        result_y[winner_targets] = centers[winners, 1].astype(np.int64)
+        result_area[winner_targets] = areas[winners]
+
+    return list(zip(result_x.tolist(), result_y.tolist(), dot_map.columns.tolist(), result_area.tolist()))
+
+
+class DotMapStore:
+    """
+    Reference dot maps per (product, camera, region), recorded once and kept in memory.
+    Every map is one .npz file in `directory`.
+    """
+    def __init__(self, directory=DOT_MAP_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._maps = {}  # (product, camera, region) -> DotMap, None if there is no file
+
+    def path(self, product, camera, region):
+        return os.path.join(self.directory, f"{product}_{camera}_{region}.npz")
+
+    def get(self, product, camera, region):
+        key = (product, camera, region)
+        with self._lock:
+            if key not in self._maps:
+                path = self.path(*key)
+                try:
+                    self._maps[key] = DotMap.load(path)
+                    logging.info(f"Dot map loaded from {path}")
+                except FileNotFoundError:
+                    self._maps[key] = None
+                except (OSError, KeyError, ValueError) as e:
+                    logging.error(f"Failed to load dot map from {path}: {e}")
+                    self._maps[key] = None
+            return self._maps[key]
+
+    def record(self, product, camera, region, dots):
+        """
+        Records the dot list [[x, y, col, area], ...] of a good tablet as the reference map.
+        """
+        dot_map = DotMap.from_dots(dots)
+        if len(dot_map) < 3:
+            raise ValueError(f"A dot map needs at least 3 dots, got {len(dot_map)}.")
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(product, camera, region)
+        dot_map.save(path)
+        with self._lock:
+            self._maps[(product, camera, region)] = dot_map
+        logging.info(f"Dot map with {len(dot_map)} dots saved to {path}")
+        return dot_map
+
+    def summary(self):
+        """
+        Dot count of every recorded map, keyed by its file name.
+        """
+        if not os.path.isdir(self.directory):
+            return {}
+        summary = {}
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.npz'):
+                try:
+                    with np.load(os.path.join(self.directory, name)) as data:
+                        summary[name[:-4]] = int(len(data['points']))
+                except (OSError, KeyError, ValueError):
+                    continue
+        return summary
+
+
+# Process-wide dot map store
+dot_maps = DotMapStore()
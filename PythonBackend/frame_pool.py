@@ -0,0 +1,111 @@
+import logging
+import threading
+
+import numpy as np
+
+from settings_manager import get_settings
+
+# Buffers of a pool beyond the frame ring: the frame being grabbed, an analysis and an encode
+SPARE_BUFFERS = 3
+
+
+class FrameBuffer:
+    """
+    A pooled frame: a preallocated image with a reference count.
+
+    Every holder of a reference reads the frame through `image`, a read-only view, and gives
+    its reference back with release() (or by leaving a `with` block). The buffer goes back to
+    its pool when the last reference is released, the view must not be used after that.
+    """
+    def __init__(self, pool, shape, dtype):
+        self._pool = pool
+        self.array = np.empty(shape, dtype)  # Writable, only for the producer filling it
+        self.image = self.array.view()
+        self.image.flags.writeable = False
+        self.sequence = 0
+        self.timestamp = 0.0
+        self._refs = 0
+
+    def retain(self):
+        """
+        Takes another reference. Returns the buffer.
+        """
+        with self._pool._lock:
+            if self._refs <= 0:
+                raise RuntimeError("Cannot retain a released frame buffer.")
+            self._refs += 1
+        return self
+
+    def release(self):
+        self._pool._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class FramePool:
+    """
+    Preallocated frame buffers of one camera, so steady-state grabbing allocates no frames.
+
+    acquire() hands out a free buffer (with one reference), the pool only allocates a new one
+    when all of them are in use. A frame of another shape than the pool's, e.g. after the
+    camera Width/Height changed, switches the pool to that shape: the free buffers are
+    dropped and the ones still in use are dropped when they are released.
+    """
+    def __init__(self, shape, dtype=np.uint8, count=0):
+        self._lock = threading.Lock()
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._free = [FrameBuffer(self, self.shape, self.dtype) for _ in range(count)]
+        self._allocated = count
+
+    @classmethod
+    def for_camera(cls, camera_type, count):
+        """
+        A pool of `count` mono 8 bit buffers sized to the camera's Width x Height in settings.json.
+        """
+        params = get_settings().get('camera_params', {}).get(camera_type, {})
+        width, height = params.get('Width'), params.get('Height')
+        if not width or not height:
+            logging.warning(f"No Width/Height for {camera_type} camera in settings, "
+                            "frame buffers are allocated on the first grab.")
+            return cls((0, 0))
+        return cls((int(height), int(width)), np.uint8, count)
+
+    def acquire(self, shape, dtype=np.uint8):
+        """
+        A buffer for a frame of `shape` and `dtype`, holding one reference.
+        """
+        shape, dtype = tuple(shape), np.dtype(dtype)
+        with self._lock:
+            if shape != self.shape or dtype != self.dtype:
+                logging.info(f"Frame pool switches from {self.shape} {self.dtype} to {shape} {dtype}.")
+                self.shape, self.dtype = shape, dtype
+                self._allocated -= len(self._free)
+                self._free.clear()
+            if self._free:
+                buffer = self._free.pop()
+            else:
+                buffer = FrameBuffer(self, shape, dtype)
+                self._allocated += 1
+            buffer._refs = 1
+            return buffer
+
+    def _release(self, buffer):
+        with self._lock:
+            if buffer._refs <= 0:
+                raise RuntimeError("Frame buffer released more often than retained.")
+            buffer._refs -= 1
+            if buffer._refs:
+                return
+            if buffer.array.shape == self.shape and buffer.array.dtype == self.dtype:
+                self._free.append(buffer)
+            else:
+                self._allocated -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"shape": list(self.shape), "allocated": self._allocated, "free": len(self._free)}
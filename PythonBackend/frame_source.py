@@ -0,0 +1,355 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+from pypylon import pylon
+
+import globals
+from frame_pool import FramePool, SPARE_BUFFERS
+from settings_manager import get_settings
+
+# Latest frames kept per camera, the oldest one is dropped first
+FRAME_RING_SIZE = 4
+# How long a stream client waits for the next frame before it checks the stream is still running
+FRAME_WAIT_TIMEOUT = 1.0
+# How long stop() waits for the acquisition thread, in seconds
+STOP_TIMEOUT = 2.0
+# Deadline for a snapshot, in seconds
+SNAPSHOT_TIMEOUT = 5.0
+# "event": pylon's grab loop pushes the frames into an ImageEventHandler,
+# "poll": an acquisition thread of ours polls RetrieveResult
+ACQUISITION_MODES = ("event", "poll")
+
+
+class FrameEventHandler(pylon.ImageEventHandler):
+    """
+    Pushes the frames of the InstantCamera's own grab loop into a CameraFrameSource.
+    """
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+
+    def OnImageGrabbed(self, camera, grab_result):
+        # Runs in the grab loop thread, pylon releases the grab result afterwards
+        try:
+            if grab_result.GrabSucceeded():
+                self.source._publish(self.source._copy(grab_result))
+            else:
+                logging.warning(f"{self.source.camera_type.capitalize()} grab failed: "
+                                f"{grab_result.GetErrorDescription()}")
+        except Exception as e:
+            logging.error(f"Error in {self.source.camera_type} image event handler: {e}")
+
+
+class DeviceRemovalHandler(pylon.ConfigurationEventHandler):
+    """
+    Cleans up a CameraFrameSource in event mode when its camera is unplugged.
+    """
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+
+    def OnCameraDeviceRemoved(self, camera):
+        # Runs in pylon's removal monitoring thread, the camera is stopped and closed from another one
+        threading.Thread(target=self.source._device_removed, args=(camera,),
+                         name=f"DeviceRemoved-{self.source.camera_type}", daemon=True).start()
+
+
+class CameraFrameSource:
+    """
+    The single producer of a camera's live frames: one acquisition grabs, every consumer
+    (stream clients, analysis snapshots, save_next_frame) reads.
+
+    The acquisition mode comes from settings.json ("acquisition": {"mode": ...}). In "event" mode
+    the camera's grab loop pushes every frame through a FrameEventHandler, nothing waits in the
+    driver but pylon's own thread. In "poll" mode an acquisition thread polls RetrieveResult and
+    holds the grab lock only for that call.
+
+    Each frame is copied once into a FramePool buffer and published into a small ring. Readers
+    get FrameBuffers they hold a reference of and must release. The latest frame is JPEG-encoded
+    at most once per scale and shared by all stream clients.
+
+    globals.stream_running / globals.stream_threads mirror the state of the acquisition.
+    """
+    def __init__(self, camera_type, ring_size=FRAME_RING_SIZE):
+        self.camera_type = camera_type
+        self.ring_size = ring_size
+        self._frames = deque()  # FrameBuffers, oldest first
+        self._pool = None
+        self._sequence = 0
+        self._new_frame = threading.Condition()
+        self._encode_lock = threading.Lock()
+        self._jpegs = {}  # scale -> (sequence, encoded bytes)
+        self._lock = threading.Lock()  # Serializes start() and stop()
+        self._thread = None
+        self._handler = None
+        self._removal_handler = None
+        self._camera = None
+        self.mode = None
+
+    @property
+    def running(self):
+        return globals.stream_running.get(self.camera_type, False)
+
+    def start(self):
+        """
+        Starts the acquisition unless it is running. Returns False if the camera is not open.
+        """
+        with self._lock:
+            camera = globals.cameras.get(self.camera_type)
+            if camera is None or not camera.IsOpen():
+                return False
+            thread_alive = self._thread is not None and self._thread.is_alive()
+            if self.running and camera is self._camera and (thread_alive or self._handler is not None):
+                return True
+            if thread_alive:
+                self._thread.join(STOP_TIMEOUT)  # Still winding down after a stop
+
+            if self._pool is None:
+                self._pool = FramePool.for_camera(self.camera_type, self.ring_size + SPARE_BUFFERS)
+            mode = get_settings().get('acquisition', {}).get('mode', 'event')
+            if mode not in ACQUISITION_MODES:
+                logging.warning(f"Unknown acquisition mode '{mode}', polling instead.")
+                mode = 'poll'
+            logging.info(f"{self.camera_type.capitalize()} frame source starts in {mode} mode.")
+            # An event mode start that was never stopped left its removal handler on the camera
+            removal_handler, self._removal_handler = self._removal_handler, None
+            if removal_handler is not None:
+                try:
+                    self._camera.DeregisterConfiguration(removal_handler)
+                except Exception as e:
+                    logging.warning(f"Failed to deregister the {self.camera_type} removal handler: {e}")
+            self._camera, self.mode = camera, mode
+
+            if mode == 'event':
+                self._thread = None
+                globals.stream_threads[self.camera_type] = None
+                globals.stream_running[self.camera_type] = True  # Before the first frame is pushed
+                with globals.grab_locks[self.camera_type]:
+                    if camera.IsGrabbing():
+                        camera.StopGrabbing()  # Grabbing without the grab loop, restart it with one
+                    self._handler = FrameEventHandler(self)
+                    camera.RegisterImageEventHandler(self._handler, pylon.RegistrationMode_ReplaceAll,
+                                                     pylon.Cleanup_None)
+                    self._removal_handler = DeviceRemovalHandler(self)
+                    camera.RegisterConfiguration(self._removal_handler, pylon.RegistrationMode_Append,
+                                                 pylon.Cleanup_None)
+                    camera.StartGrabbing(pylon.GrabStrategy_LatestImageOnly, pylon.GrabLoop_ProvidedByInstantCamera)
+                return True
+
+            with globals.grab_locks[self.camera_type]:
+                if not camera.IsGrabbing():
+                    logging.info(f"{self.camera_type.capitalize()} camera starting grabbing.")
+                    camera.StartGrabbing(pylon.GrabStrategy_LatestImageOnly)
+            globals.stream_running[self.camera_type] = True
+            self._thread = threading.Thread(target=self._run, args=(camera,),
+                                            name=f"FrameSource-{self.camera_type}", daemon=True)
+            globals.stream_threads[self.camera_type] = self._thread
+            self._thread.start()
+            return True
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """
+        Stops the acquisition. Waits up to `timeout` seconds for the acquisition thread, the
+        grab loop of event mode is stopped with the grabbing. The ring is emptied, its buffers go
+        back to the pool (readers holding a frame keep it until they release it).
+        """
+        with self._lock:
+            globals.stream_running[self.camera_type] = False
+            with self._new_frame:
+                self._new_frame.notify_all()
+            handler, self._handler = self._handler, None
+            removal_handler, self._removal_handler = self._removal_handler, None
+            if handler is not None:
+                camera = self._camera
+                try:
+                    with globals.grab_locks[self.camera_type]:
+                        if camera.IsGrabbing():
+                            camera.StopGrabbing()
+                        camera.DeregisterImageEventHandler(handler)
+                        if removal_handler is not None:
+                            camera.DeregisterConfiguration(removal_handler)
+                except Exception as e:
+                    logging.warning(f"Failed to stop the {self.camera_type} grab loop: {e}")
+            thread = self._thread
+            if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout)
+            globals.stream_threads[self.camera_type] = None
+            self._clear()
+
+    def _clear(self):
+        """
+        Empties the ring, its buffers go back to the pool, and drops the encoded frames.
+        """
+        with self._new_frame:
+            while self._frames:
+                self._frames.popleft().release()
+        with self._encode_lock:
+            self._jpegs.clear()
+
+    def _device_removed(self, camera):
+        """
+        Cleans up after the camera was unplugged, in either acquisition mode: the source stops,
+        waiting readers wake up, the camera is closed and forgotten.
+        """
+        logging.error(f"{self.camera_type.capitalize()} camera has been removed.")
+        if camera is self._camera:
+            globals.stream_running[self.camera_type] = False
+            self._handler = self._removal_handler = None  # Went with the device
+        with self._new_frame:
+            self._new_frame.notify_all()
+        if camera.IsOpen():
+            try:
+                camera.StopGrabbing()
+                camera.Close()
+            except Exception as close_err:
+                logging.error(f"Failed to close {self.camera_type} after unplug: {close_err}")
+        if globals.cameras.get(self.camera_type) is camera:
+            globals.cameras[self.camera_type] = None  # Now future status checks see `None => not connected`
+        if camera is self._camera:
+            self._clear()
+
+    def _run(self, camera):
+        logging.info(f"{self.camera_type.capitalize()} frame source started.")
+        try:
+            while self.running:
+                buffer = None
+                with globals.grab_locks[self.camera_type]:
+                    grab_result = camera.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
+                    try:
+                        if grab_result.GrabSucceeded():
+                            buffer = self._copy(grab_result)
+                    finally:
+                        grab_result.Release()
+                if buffer is not None:
+                    self._publish(buffer)
+
+        except Exception as e:
+            if not self.running:
+                return  # StopGrabbing during a stop aborts the pending RetrieveResult
+            logging.error(f"Error in {self.camera_type} frame source: {e}")
+
+            if "Device has been removed" in str(e):
+                self._device_removed(camera)
+
+        finally:
+            if globals.stream_threads.get(self.camera_type) in (None, threading.current_thread()):
+                globals.stream_running[self.camera_type] = False
+            with self._new_frame:
+                self._new_frame.notify_all()
+            logging.info(f"{self.camera_type.capitalize()} frame source stopped.")
+
+    def _copy(self, grab_result):
+        """
+        The one copy of a frame, from the pylon buffer into a pooled one.
+        """
+        with grab_result.GetArrayZeroCopy() as array:
+            buffer = self._pool.acquire(array.shape, array.dtype)
+            np.copyto(buffer.array, array)
+        return buffer
+
+    def _publish(self, buffer):
+        with self._new_frame:
+            if not self.running:
+                buffer.release()  # Grabbed while stopping, the ring stays empty
+                return
+            self._sequence += 1
+            buffer.sequence, buffer.timestamp = self._sequence, time.time()
+            self._frames.append(buffer)
+            if len(self._frames) > self.ring_size:
+                self._frames.popleft().release()
+            self._new_frame.notify_all()
+
+    def latest(self):
+        """
+        The latest frame as a FrameBuffer the caller must release, None before the first frame.
+        """
+        with self._new_frame:
+            return self._frames[-1].retain() if self._frames else None
+
+    def pool_stats(self):
+        return self._pool.stats() if self._pool is not None else None
+
+    def snapshot(self, newer_than=None, timeout=SNAPSHOT_TIMEOUT):
+        """
+        The latest frame grabbed after `newer_than` (epoch seconds, None for any frame) as a
+        FrameBuffer the caller must release. Returns at once if there is one, otherwise waits for
+        the next frame until the deadline. None if no such frame arrived in time or the source
+        stopped.
+        """
+        def fresh():
+            return bool(self._frames) and (newer_than is None or self._frames[-1].timestamp > newer_than)
+
+        with self._new_frame:
+            self._new_frame.wait_for(lambda: fresh() or not self.running, timeout)
+            return self._frames[-1].retain() if fresh() else None
+
+    def save_next_frame(self, directory, timeout=SNAPSHOT_TIMEOUT):
+        """
+        Writes the first frame grabbed after this call to `directory` as IMG_<timestamp>.jpg.
+        Returns the file path, None if no frame arrived in time.
+        """
+        frame = self.snapshot(newer_than=time.time(), timeout=timeout)
+        if frame is None:
+            return None
+        with frame:
+            timestamp = time.strftime("%Y%m%d%H%M%S", time.localtime(frame.timestamp))
+            path = os.path.join(directory, f"IMG_{timestamp}.jpg")
+            if not cv2.imwrite(path, frame.image):
+                raise IOError(f"Failed to write {path}")
+        return path
+
+    def wait_for_frame(self, after_sequence, timeout=FRAME_WAIT_TIMEOUT):
+        """
+        Waits for a frame newer than `after_sequence`. Returns the latest sequence, or None if
+        none arrived within `timeout` or the source stopped.
+        """
+        with self._new_frame:
+            self._new_frame.wait_for(lambda: self._sequence > after_sequence or not self.running, timeout)
+            return self._sequence if self._sequence > after_sequence else None
+
+    def jpeg(self, scale_factor=0.25):
+        """
+        The latest frame scaled by `scale_factor` and JPEG-encoded as (sequence, bytes), encoded
+        at most once per frame and scale. None before the first frame.
+        """
+        frame = self.latest()
+        if frame is None:
+            return None
+        with frame, self._encode_lock:
+            sequence, image = frame.sequence, frame.image
+            cached = self._jpegs.get(scale_factor)
+            if cached is not None and cached[0] >= sequence:
+                return cached
+
+            if scale_factor != 1.0:
+                width = int(image.shape[1] * scale_factor)
+                height = int(image.shape[0] * scale_factor)
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            _, encoded = cv2.imencode('.jpg', image)
+            self._jpegs[scale_factor] = (sequence, encoded.tobytes())
+            return self._jpegs[scale_factor]
+
+    def mjpeg_frames(self, scale_factor=0.25):
+        """
+        MJPEG multipart chunks of every new frame until the source stops.
+        """
+        sequence = 0
+        while self.running:
+            if self.wait_for_frame(sequence) is None:
+                continue
+            encoded = self.jpeg(scale_factor)
+            if encoded is None:
+                continue  # The ring was emptied by a stop
+            sequence, frame = encoded
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+        logging.info(f"{self.camera_type.capitalize()} stream client finished.")
+
+
+# One frame source per camera
+frame_sources = {camera_type: CameraFrameSource(camera_type) for camera_type in globals.cameras}
@@ -1,5 +1,6 @@
 import threading
 from flask import Flask
+from measurement_store import MeasurementStore
 turntable_position = "?"
 turntable_homed = False 
 latest_barcode = ""
@@ -28,16 +29,14 @@ grab_locks = {
     'side': threading.Lock()
 }
 
-measurement_data = []
 result_counts = [0, 0, 0]
 
 # Image Analysis Results
-x_end = 2884
+x_end = 2884  # Default only, the measured value lives in the calibration store
 total_last_column_area = []
 last_column_idx = 0
 
-dot_id_counter = 1  # Used for stable IDs, incremented each time we add a dot
-measurement_data = []  # Will store [dot_id, x, y, col, area]
+measurement_data = MeasurementStore()  # [dot_id, x, y, col, area] rows, dot ids count from 1
 locked_class1_count = 0  # Once a dot is deemed class 1, or missing, it’s locked in
 result_counts = [0,0,0]  # optional, if you want to store the last result
 last_blob_counts = {
@@ -45,5 +44,3 @@ last_blob_counts = {
     "center_slice": 0,
     "outer_slice": 0
 }
-
-latest_image = None
\ No newline at end of file
@@ -0,0 +1,133 @@
+import os
+import queue
+import logging
+import threading
+import atexit
+import contextlib
+from collections import OrderedDict
+
+import cv2
+
+# Images waiting to be written, a full queue blocks the producer until the worker caught up
+MAX_PENDING_IMAGES = 8
+# How long shutdown waits for the queued images, in seconds
+FLUSH_TIMEOUT = 30.0
+# Result images whose write state is remembered, the oldest one is forgotten first
+MAX_TRACKED_IMAGES = 256
+
+
+class ImageWriter:
+    """
+    Writes result images in a background thread, so the analysis requests return as soon as
+    the measurement is done.
+
+    The pipelines hand over the frame (and optionally a draw function with the dots to draw on
+    it, run in the worker too), the file name is fixed at submit time. Every path is reported
+    as "pending" until its file is "written" (or "failed"). The queue is bounded: every entry
+    holds a full resolution frame, a producer that outruns the disk waits instead of piling
+    them up.
+    """
+    def __init__(self, max_pending=MAX_PENDING_IMAGES):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = {}  # path -> number of queued writes
+        self._states = OrderedDict()  # path -> "pending", "written" or "failed", oldest first
+        self._collecting = threading.local()
+        self._thread = None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ImageWriter", daemon=True)
+                self._thread.start()
+
+    def submit(self, path, image, draw=None, *draw_args):
+        """
+        Queues `image` to be written to `path`. With `draw`, draw(image, *draw_args) runs in the
+        worker first and its result is written instead. Returns the path.
+        """
+        with self._lock:
+            self._pending[path] = self._pending.get(path, 0) + 1
+            self._set_state(path, "pending")
+        collected = getattr(self._collecting, 'paths', None)
+        if collected is not None and path not in collected:
+            collected.append(path)
+        self._start()
+        self._queue.put((path, image, draw, draw_args))
+        return path
+
+    def _run(self):
+        while True:
+            path, image, draw, draw_args = self._queue.get()
+            error = None
+            try:
+                if draw is not None:
+                    image = draw(image, *draw_args)
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if not cv2.imwrite(path, image):
+                    error = "cv2.imwrite failed"
+            except Exception as e:
+                error = str(e)
+            if error is not None:
+                logging.error(f"Failed to write image {path}: {error}")
+
+            with self._lock:
+                self._pending[path] -= 1
+                if not self._pending[path]:
+                    del self._pending[path]
+                    self._set_state(path, "written" if error is None else "failed")
+                if not self._pending:
+                    self._idle.notify_all()
+            self._queue.task_done()
+
+    def _set_state(self, path, state):
+        self._states[path] = state
+        self._states.move_to_end(path)
+        while len(self._states) > MAX_TRACKED_IMAGES:
+            self._states.popitem(last=False)
+
+    @contextlib.contextmanager
+    def collect(self):
+        """
+        Collects the paths the current thread submits inside the `with` block into the yielded
+        list, e.g. the result images of one analysis request.
+        """
+        previous = getattr(self._collecting, 'paths', None)
+        self._collecting.paths = paths = []
+        try:
+            yield paths
+        finally:
+            self._collecting.paths = previous
+
+    def status(self, path):
+        """
+        "pending", "written", "failed" or "unknown" (not submitted recently).
+        """
+        with self._lock:
+            return self._states.get(path, "unknown")
+
+    def statuses(self, paths):
+        """
+        {path: status} of every path, see status().
+        """
+        with self._lock:
+            return {path: self._states.get(path, "unknown") for path in paths}
+
+    def pending_count(self):
+        with self._lock:
+            return sum(self._pending.values())
+
+    def flush(self, timeout=None):
+        """
+        Waits until every queued image is written. Returns False if the timeout expired first.
+        """
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+
+# Process-wide image writer of the analysis pipelines
+image_writer = ImageWriter()
+atexit.register(image_writer.flush, FLUSH_TIMEOUT)
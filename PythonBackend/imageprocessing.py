@@ -2,26 +2,271 @@ import cv2
 import numpy as np
 import os
 from concurrent.futures import ThreadPoolExecutor
-import pandas as pd
 import matplotlib.pyplot as plt
 import time
 from collections import Counter, defaultdict
 
 import globals
+import template_bank
+import template_store
+from location_tracker import tracker
+from calibration_store import calibration
+from blob_extractor import extract_blobs, DOT_THRESHOLD
+from column_index import trace_columns
+from dot_lattice import fit_column_lattice
+from dot_map import register_dots, measure_dots
+from image_writer import image_writer
+from result_log import result_log
+
+
+# Coarse-to-fine schedule used by home_turntable_with_image: each entry is
+# (angle step in degrees, scale percent). The first level sweeps the full
+# circle, every further level only re-sweeps +/- the previous step around the
+# best candidates of the level before it.
+HOMING_ANGLE_SCHEDULE = ((2.0, 5), (0.5, 10), (0.1, 10))
+HOMING_TOP_CANDIDATES = 3
+# The banked templates are rotated around the full resolution center, the crop is matched
+# with this many pixels of slack so the sub-pixel difference does not cost correlation
+HOMING_BANK_MARGIN = 2
+
+# Log-polar homing engine: working scale and angular resolution of the polar unwrap
+HOMING_LOGPOLAR_SCALE = 20
+HOMING_LOGPOLAR_ANGLE_BINS = 720
+
+# Dilation kernels of the polygon masks of the inner slice and side slice templates
+ISLICE_MASK_KERNEL = 35
+SIDE_MASK_KERNEL = 200
+
+# Template matching of the analysis pipelines: the template is located on images downscaled
+# by this factor first, then refined at full resolution in a window of this many pixels of
+# slack around the coarse location. A factor of 1 matches at full resolution only.
+TEMPLATE_MATCH_PYRAMID_FACTOR = 4
+TEMPLATE_MATCH_REFINE_MARGIN = 16
+
+# Dot extraction of the analysis pipelines (see blob_extractor.extract_blobs). "contour" keeps the
+# contour polygon areas the classification thresholds were tuned on, "components" is the single
+# connectedComponentsWithStats pass with pixel count areas.
+BLOB_EXTRACTION_MODE = "contour"
+# Dot centers of the slice pipelines: "centroid" is the vectorized contour centroid, "enclosing_circle"
+# the cv2.minEnclosingCircle center they used to take (one call per dot). The two agree within 1 px
+# with the same areas and columns, see benchmarks/bench_blob_centers.py
+SLICE_BLOB_CENTER_MODE = "centroid"
+# Inner slice column clustering: "vectorized", "lattice" to snap the dots to a fitted column grid
+# (also reports missing dots inside columns), "polar" to group the dots by their angle around the
+# tablet center, or "legacy" for the original per-column rescans
+ISLICE_CLUSTERING = "vectorized"
+# Polar clustering: bin width of the angle histogram (degrees), angular resolution of the unwrapped
+# view and whether that view is saved next to the result image
+POLAR_HISTOGRAM_BIN = 0.01
+POLAR_ANGLE_BINS = 3600
+SAVE_POLAR_VIEW = False
+
+
+def _homing_preprocess(image, scale_percent):
+    return cv2.resize(image, None, fx=scale_percent / 100, fy=scale_percent / 100, interpolation=cv2.INTER_AREA)
+
+
+def _homing_rotate(image, angle):
+    center = (image.shape[1] // 2, image.shape[0] // 2)
+    rotation_matrix = cv2.getRotationMatrix2D(center, angle, 1)
+    return cv2.warpAffine(image, rotation_matrix, (image.shape[1], image.shape[0]))
+
+
+def _homing_crop(target_small, template_small, margin=0):
+    """
+    Locates the template in the downscaled target and returns the matched crop,
+    grown by `margin` pixels on every side (zero padded at the image border).
+    """
+    result = cv2.matchTemplate(target_small, template_small, cv2.TM_CCOEFF_NORMED)
+    _, _, _, max_loc = cv2.minMaxLoc(result)
+    h, w = template_small.shape
+    top_left = max_loc
+    if margin:
+        target_small = cv2.copyMakeBorder(target_small, margin, margin, margin, margin, cv2.BORDER_CONSTANT)
+    return target_small[top_left[1]:top_left[1] + h + 2 * margin, top_left[0]:top_left[0] + w + 2 * margin]
+
+
+def _homing_sweep(cropped_region, template_small, angles):
+    """
+    Scores every angle in `angles` by rotating the crop and correlating it with the template.
+    Returns a list of (angle, score) tuples in the order of `angles`.
+    """
+    def score_angle(angle):
+        rotated = _homing_rotate(cropped_region, angle)
+        return angle, cv2.matchTemplate(rotated, template_small, cv2.TM_CCOEFF_NORMED).max()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        return list(executor.map(score_angle, angles))
+
+
+def _homing_sweep_bank(cropped_region, bank, rotation, angles):
+    """
+    Same scores as _homing_sweep, but instead of rotating the crop by every angle the crop
+    is matched against the precomputed template rotated the other way. For the template
+    orientation `rotation` that is the bank entry at (rotation - angle).
+    Returns a list of (angle, score) tuples in the order of `angles`.
+    """
+    return [
+        (angle, cv2.matchTemplate(cropped_region, bank.rotated(rotation - angle), cv2.TM_CCOEFF_NORMED).max())
+        for angle in angles
+    ]
+
+
+def _homing_refine_angles(candidates, previous_step, step):
+    """
+    Builds the angle grid for the next schedule level: +/- previous_step around
+    every candidate, sampled at `step`, with duplicates removed.
+    """
+    offsets = np.arange(-previous_step, previous_step + step / 2, step)
+    angles = np.concatenate([candidate + offsets for candidate in candidates])
+    return np.unique(np.round(angles, 6))
+
+
+def _homing_search_hierarchical(target_levels, banks, rotation, angle_schedule, top_candidates):
+    """
+    Coarse-to-fine angle search for one template orientation.
+    target_levels maps scale percent -> downscaled target, banks maps scale percent -> RotatedTemplateBank.
+    Returns (best_angle, best_score) of the finest schedule level.
+    """
+    candidates = None
+    previous_step = None
+    results = []
+
+    for step, level_scale in angle_schedule:
+        bank = banks[level_scale]
+        template_small = bank.rotated(rotation)
+        cropped_region = _homing_crop(target_levels[level_scale], template_small, HOMING_BANK_MARGIN)
+
+        if candidates is None:
+            angles = np.round(np.arange(-180, 180, step), 6)
+        else:
+            angles = _homing_refine_angles(candidates, previous_step, step)
+
+        results = _homing_sweep_bank(cropped_region, bank, rotation, angles)
+        ranked = sorted(results, key=lambda item: item[1], reverse=True)
+        candidates = [angle for angle, _ in ranked[:top_candidates]]
+        previous_step = step
+
+    best_angle, best_score = max(results, key=lambda item: item[1])
+    return best_angle, best_score
+
+
+def _homing_search_exhaustive(target_small, bank, rotation):
+    """
+    Brute-force 0.1 degree sweep over the full circle for one template orientation.
+    Returns (best_angle, best_score).
+    """
+    template_small = bank.rotated(rotation)
+    cropped_region = _homing_crop(target_small, template_small, HOMING_BANK_MARGIN)
+
+    best_angle = 0
+    best_score = -float('inf')
+    for angle, score in _homing_sweep_bank(cropped_region, bank, rotation, np.arange(-180, 180, 0.1)):
+        if score > best_score:
+            best_score = score
+            best_angle = angle
 
+    return best_angle, best_score
 
-def home_turntable_with_image(image, scale_percent=10, resize_percent=20):
+
+def _homing_polar_spectrum(image, angle_bins):
+    """
+    Polar unwrap of the magnitude spectrum of a crop. The magnitude spectrum does not
+    depend on where the tablet sits inside the crop, and a rotation of the crop becomes
+    a shift along the angle axis of the unwrap.
+    """
+    blurred = cv2.GaussianBlur(image, (3, 3), 0).astype(np.float32)
+    h, w = blurred.shape
+
+    # Circular cosine window so the crop borders do not add a cross to the spectrum
+    yy, xx = np.mgrid[:h, :w]
+    rr = np.hypot((xx - w / 2) / (w / 2), (yy - h / 2) / (h / 2))
+    window = np.where(rr < 1, 0.5 + 0.5 * np.cos(np.pi * rr), 0).astype(np.float32)
+
+    spectrum = np.abs(np.fft.fftshift(np.fft.fft2((blurred - blurred.mean()) * window)))
+    spectrum = np.log1p(spectrum).astype(np.float32)
+
+    radius = min(h, w) / 2
+    polar = cv2.warpPolar(spectrum, (int(radius), angle_bins), (w / 2, h / 2), radius, cv2.WARP_POLAR_LINEAR)
+    # The per-radius mean is the same for every rotation, drop it
+    return polar - polar.mean(axis=0, keepdims=True)
+
+
+def _homing_search_logpolar(target, template, scale_percent=HOMING_LOGPOLAR_SCALE,
+                            angle_bins=HOMING_LOGPOLAR_ANGLE_BINS):
+    """
+    Closed-form rotation estimate with polar-unwrapped magnitude spectra and
+    cv2.phaseCorrelate. The spectrum is symmetric, so the 180 degree ambiguity is
+    resolved with two correlations, then the estimate is polished with a +/- 3 degree sweep.
+    Returns (best_angle, confidence) where confidence is the phase correlation response
+    times the correlation score at the polished angle.
+    """
+    target_small = _homing_preprocess(target, scale_percent)
+    template_small = _homing_preprocess(template, scale_percent)
+
+    # The dot pattern is circular, so a blurred match finds the tablet at any rotation
+    result = cv2.matchTemplate(cv2.GaussianBlur(target_small, (9, 9), 0),
+                               cv2.GaussianBlur(template_small, (9, 9), 0), cv2.TM_CCOEFF_NORMED)
+    _, _, _, max_loc = cv2.minMaxLoc(result)
+    h, w = template_small.shape
+    cropped_region = target_small[max_loc[1]:max_loc[1] + h, max_loc[0]:max_loc[0] + w]
+    # Padded crop for the correlation checks, so a small offset of the match does not bias the angle
+    margin = 8
+    padded_region = cv2.copyMakeBorder(target_small, margin, margin, margin, margin, cv2.BORDER_CONSTANT)
+    padded_region = padded_region[max_loc[1]:max_loc[1] + h + 2 * margin, max_loc[0]:max_loc[0] + w + 2 * margin]
+
+    polar_template = _homing_polar_spectrum(template_small, angle_bins)
+    polar_crop = _homing_polar_spectrum(cropped_region, angle_bins)
+    # Window only the radius axis, the angle axis is periodic
+    window = np.tile(np.hanning(polar_template.shape[1]).astype(np.float32), (angle_bins, 1))
+    (_, shift), response = cv2.phaseCorrelate(polar_template, polar_crop, window)
+
+    estimate = round(shift * 360 / angle_bins, 1)
+    estimate, _ = max(_homing_sweep(padded_region, template_small, [estimate, estimate + 180]),
+                      key=lambda item: item[1])
+    angles = _homing_refine_angles([estimate], 3.0, 0.1)
+    best_angle, best_score = max(_homing_sweep(padded_region, template_small, angles), key=lambda item: item[1])
+    # Neither value alone separates good from bad estimates, their product does
+    confidence = float(np.clip(response, 0, 1) * np.clip(best_score, 0, 1))
+    return best_angle, confidence
+
+
+def warm_homing_banks(angle_schedule=HOMING_ANGLE_SCHEDULE):
+    """
+    Builds (or loads) the rotated template banks used by home_turntable_with_image,
+    so the first homing after startup does not pay for it.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    template_path = os.path.join(script_dir, 'templ03.jpg')
+    bank_steps = {}
+    for step, level_scale in angle_schedule:
+        bank_steps[level_scale] = min(step, bank_steps.get(level_scale, step))
+    for level_scale, step in bank_steps.items():
+        template_bank.get_rotation_bank(template_path, level_scale, step)
+
+
+def home_turntable_with_image(image, scale_percent=10, resize_percent=20,
+                              angle_schedule=HOMING_ANGLE_SCHEDULE, top_candidates=HOMING_TOP_CANDIDATES,
+                              engine="sweep", return_confidence=False):
     """
     Align a template to a target image and find the best rotation angle.
     Includes handling for rotated and vertically mirrored images.
 
     Parameters:
         image (numpy array): Target image loaded as a numpy array.
-        scale_percent (int): Percent to scale down images for computation.
+        scale_percent (int): Percent to scale down images for computation (exhaustive search only).
         resize_percent (int): Percent to resize images for visualization.
+        angle_schedule (sequence of (step, scale_percent)): Coarse-to-fine search levels.
+            Pass None to run the exhaustive 0.1 degree sweep instead.
+        top_candidates (int): Number of best angles refined at every schedule level.
+        engine (str): "sweep" for the template sweep, "logpolar" for the phase correlation estimate.
+        return_confidence (bool): Also return the confidence of the estimate.
 
     Returns:
         float: The best alignment angle in degrees
+        (float, float): (angle, confidence) if return_confidence is set. The confidence is the
+            best TM_CCOEFF_NORMED score for "sweep" and the phase correlation response times
+            that score for "logpolar".
     """
 
 
@@ -31,69 +276,41 @@ def home_turntable_with_image(image, scale_percent=10, resize_percent=20):
     # Construct the template path dynamically
     script_dir = os.path.dirname(os.path.abspath(__file__))
     template_path = os.path.join(script_dir, 'templ03.jpg')
-    template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
 
-    if target is None or template is None:
+    if target is None or not os.path.exists(template_path):
         raise FileNotFoundError("Target or template image not found. Check the file paths.")
 
-    # Preprocessing with Canny edge detection
-    def preprocess(image, scale_percent):
-        return cv2.resize(image, None, fx=scale_percent / 100, fy=scale_percent / 100, interpolation=cv2.INTER_AREA)
-
-    # Preprocess the target and template
-    target_small = preprocess(target, scale_percent)
-
-    # Rotate the template and store versions
-    def rotate_image(image, angle):
-        center = (image.shape[1] // 2, image.shape[0] // 2)
-        rotation_matrix = cv2.getRotationMatrix2D(center, angle, 1)
-        return cv2.warpAffine(image, rotation_matrix, (image.shape[1], image.shape[0]))
-
-    rotated_templates = {
-        0: preprocess(template, scale_percent),  # Original template
-        90: preprocess(rotate_image(template, 90), scale_percent),
-        180: preprocess(rotate_image(template, 180), scale_percent),
-        270: preprocess(rotate_image(template, 270), scale_percent),
-    }
-
-    def find_best_match_for_angle(angle, cropped_region, template_small):
-        """
-        Helper function to compute the correlation score for a given angle.
-        """
-        rotated = rotate_image(cropped_region, angle)
-        correlation = cv2.matchTemplate(rotated, template_small, cv2.TM_CCOEFF_NORMED).max()
-        return angle, correlation
-
-    def find_best_match_and_angle(target_to_match, template_small):
-        result = cv2.matchTemplate(target_to_match, template_small, cv2.TM_CCOEFF_NORMED)
-        _, _, _, max_loc = cv2.minMaxLoc(result)
-        h, w = template_small.shape
-        top_left = max_loc
-        cropped_region = target_to_match[top_left[1]:top_left[1] + h, top_left[0]:top_left[0] + w]
-
-        # Parallelize the rotation matching
-        angles = np.arange(-180, 180, 0.1)
-        best_angle = 0
-        best_score = -float('inf')
-
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            results = list(executor.map(lambda angle: find_best_match_for_angle(angle, cropped_region, template_small), angles))
-
-        # Find the best angle and score
-        for angle, score in results:
-            if score > best_score:
-                best_score = score
-                best_angle = angle
-
-        return best_angle, best_score
-
-    # Track the best match across all templates
+    if engine not in ("sweep", "logpolar"):
+        raise ValueError(f"Unknown homing engine '{engine}'.")
+
+    if engine == "logpolar":
+        template = template_store.get_template('templ03.jpg')
+    else:
+        # The sweep only matches against the precomputed rotated template banks,
+        # one per scale at the finest step used at that scale
+        levels = angle_schedule if angle_schedule else ((0.1, scale_percent),)
+        bank_steps = {}
+        for step, level_scale in levels:
+            bank_steps[level_scale] = min(step, bank_steps.get(level_scale, step))
+        banks = {level_scale: template_bank.get_rotation_bank(template_path, level_scale, step)
+                 for level_scale, step in bank_steps.items()}
+        target_levels = {level_scale: _homing_preprocess(target, level_scale) for level_scale in bank_steps}
+
+    # Track the best match across all template orientations (0/90/180/270)
     best_angle = None
     best_score = -float('inf')
     best_rotation = 0  # Tracks the rotation of the template
 
-    for rotation, template_variant in rotated_templates.items():
-        angle, score = find_best_match_and_angle(target_small, template_variant)
+    # The log-polar estimate covers the full circle, no need for rotated templates
+    rotations = (0,) if engine == "logpolar" else (0, 90, 180, 270)
+
+    for rotation in rotations:
+        if engine == "logpolar":
+            angle, score = _homing_search_logpolar(target, template)
+        elif angle_schedule:
+            angle, score = _homing_search_hierarchical(target_levels, banks, rotation, angle_schedule, top_candidates)
+        else:
+            angle, score = _homing_search_exhaustive(target_levels[scale_percent], banks[scale_percent], rotation)
         if score > best_score:
             best_score = score
             best_angle = angle
@@ -118,15 +335,125 @@ def home_turntable_with_image(image, scale_percent=10, resize_percent=20):
 
     print(f"Best alignment angle: {adjusted_angle:.1f} degrees")
 
-
+    if return_confidence:
+        return adjusted_angle, float(best_score)
     return adjusted_angle
 
 
+def _tracked_template_match(image, template, key):
+    """
+    Matches `template` only in the tracker window around its last location.
+    Returns (max_val, max_loc), or None if the window cannot be trusted.
+    """
+    window = tracker.window(key, template.shape, image.shape)
+    if window is None:
+        return None
+
+    x0, y0, x1, y1 = window
+    result = cv2.matchTemplate(image[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    if max_val < tracker.min_score:
+        return None
+
+    # A peak on the window border may only be the slope of a better match outside of it
+    on_border = ((max_loc[0] == 0 and x0 > 0) or (max_loc[1] == 0 and y0 > 0)
+                 or (max_loc[0] == result.shape[1] - 1 and x1 < image.shape[1])
+                 or (max_loc[1] == result.shape[0] - 1 and y1 < image.shape[0]))
+    if on_border:
+        return None
+    return max_val, (max_loc[0] + x0, max_loc[1] + y0)
+
+
+def template_match(image, template, template_name=None, pyramid_factor=TEMPLATE_MATCH_PYRAMID_FACTOR,
+                   refine_margin=TEMPLATE_MATCH_REFINE_MARGIN, camera=None):
+    """
+    Best TM_CCOEFF_NORMED match of `template` in `image`.
+
+    With `camera` and `template_name` given, the template is first searched only in a padded
+    window around where it was last found on that camera (see location_tracker). The whole
+    image is searched when that match scores below the tracker threshold.
+
+    With pyramid_factor > 1 the template is located on the image downscaled by that factor,
+    then matched at full resolution only in a window `refine_margin` pixels around the
+    coarse location. The downscaled template comes from the TemplateStore when
+    `template_name` is given.
+
+    Returns:
+        (float, (int, int)): The best score and the top-left corner of the match,
+            as returned by cv2.minMaxLoc on the full resolution result.
+    """
+    key = (template_name, camera) if camera is not None and template_name is not None else None
+    if key is not None:
+        match = _tracked_template_match(image, template, key)
+        if match is not None:
+            tracker.update(key, match[1], match[0], hit=True)
+            return match
+
+    max_val, max_loc = _template_match_search(image, template, template_name, pyramid_factor, refine_margin)
+    if key is not None:
+        tracker.update(key, max_loc, max_val, hit=False)
+    return max_val, max_loc
+
+
+def _template_match_search(image, template, template_name, pyramid_factor, refine_margin):
+    template_height, template_width = template.shape
+    image_height, image_width = image.shape[:2]
+
+    if pyramid_factor > 1:
+        if template_name is not None:
+            template_small = template_store.get_pyramid_level(template_name, pyramid_factor)
+        else:
+            template_small = cv2.resize(template, None, fx=1 / pyramid_factor, fy=1 / pyramid_factor,
+                                        interpolation=cv2.INTER_AREA)
+        image_small = cv2.resize(image, None, fx=1 / pyramid_factor, fy=1 / pyramid_factor,
+                                 interpolation=cv2.INTER_AREA)
+
+        if (template_small.shape[0] <= image_small.shape[0] and template_small.shape[1] <= image_small.shape[1]
+                and min(template_small.shape) >= 8):
+            result = cv2.matchTemplate(image_small, template_small, cv2.TM_CCOEFF_NORMED)
+            _, _, _, coarse_loc = cv2.minMaxLoc(result)
+
+            # Refine around the coarse location at full resolution
+            x0 = max(coarse_loc[0] * pyramid_factor - refine_margin, 0)
+            y0 = max(coarse_loc[1] * pyramid_factor - refine_margin, 0)
+            x1 = min(coarse_loc[0] * pyramid_factor + refine_margin + template_width, image_width)
+            y1 = min(coarse_loc[1] * pyramid_factor + refine_margin + template_height, image_height)
+            result = cv2.matchTemplate(image[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, max_loc = cv2.minMaxLoc(result)
+            return max_val, (max_loc[0] + x0, max_loc[1] + y0)
+
+    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return max_val, max_loc
+
+
+def measure_with_dot_map(masked_region, dot_map, min_area=0, center_mode="centroid"):
+    """
+    Registration mode of the dot detectors: registers the dots of the region to a recorded
+    reference dot map (see dot_map.DotMap) with one affine fit and reads the area at every
+    expected position, instead of clustering the dots into columns. Missing dots are the
+    expected positions without a dot, they are reported with area 0.
+
+    Returns:
+        list of (x, y, col, area) in the map order, or None if the frame could not be registered.
+    """
+    blobs = extract_blobs(masked_region, DOT_THRESHOLD, min_area=min_area, mode=BLOB_EXTRACTION_MODE,
+                          center_mode=center_mode)
+    matrix = register_dots(dot_map, blobs.centers[:, 0], blobs.centers[:, 1])
+    if matrix is None:
+        print("Frame does not match the reference dot map, clustering the dots instead.")
+        return None
+    return measure_dots(dot_map, blobs.centers, blobs.areas, matrix)
+
+
 #PROCESS CENTER CAMERA - CIRCLE
-def process_center(image):
+def process_center(image, camera='main', dot_map=None, return_region=False):
+    """
+    The dots [[x, y, column, area], ...] of the center circle. With `return_region`, also the
+    matched region their coordinates refer to, as (dots, region).
+    """
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    template_path = os.path.join(script_dir, 'templ03_mod3.jpg')
-    template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+    template = template_store.get_template('templ03_mod3.jpg')
 
     if image is None or template is None:
         raise FileNotFoundError("Target or template image not found. Check the file paths.")
@@ -134,7 +461,14 @@ def process_center(image):
     # Step 1: Crop the input image
 
     # Step 2: Match and extract the template region
-    matched_region = center_template_match_and_extract(template, image)
+    matched_region = center_template_match_and_extract(template, image, template_name='templ03_mod3.jpg',
+                                                       camera=camera)
+
+    # Registration mode: measure at the positions of the reference dot map
+    if dot_map is not None:
+        dot_contours = measure_with_dot_map(matched_region, dot_map)
+        if dot_contours is not None:
+            return (dot_contours, matched_region) if return_region else dot_contours
 
     # Step 4: Detect small dots and extract their contours and areas
     dot_contours, annotated_dots = center_detect_small_dots_and_contours(matched_region)
@@ -142,17 +476,18 @@ def process_center(image):
     # Define the filename with timestamp
     timestamp = time.strftime("%Y%m%d_%H%M%S")
     filename = f"result_circle_{timestamp}.jpg"
-    cv2.imwrite(os.path.join(script_dir, filename), annotated_dots)
+    image_writer.submit(os.path.join(script_dir, filename), annotated_dots)
 
-    return dot_contours
+    return (dot_contours, matched_region) if return_region else dot_contours
 
-def center_template_match_and_extract(template, image):
+def center_template_match_and_extract(template, image, template_name=None,
+                                      pyramid_factor=TEMPLATE_MATCH_PYRAMID_FACTOR, camera=None,
+                                      return_location=False):
 
     template_height, template_width = template.shape
-    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
 
     # Get the location of the best match
-    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    max_val, max_loc = template_match(image, template, template_name, pyramid_factor, camera=camera)
 
     # Extract the best-matched region
     top_left = max_loc
@@ -169,65 +504,48 @@ def center_template_match_and_extract(template, image):
     nonzero_coords = np.column_stack(np.where((mask_layer) > 0))  # Get all nonzero pixel coordinates
 
     if len(nonzero_coords) > 0:
-        globals.x_end = int(np.min(nonzero_coords[:, 1]))
-
-        # Write updated x_end back to globals.py
-        with open("globals.py", "r") as file:
-            lines = file.readlines()
-
-        with open("globals.py", "w") as file:
-            for line in lines:
-                if line.startswith("x_end"):
-                    file.write(f"x_end = {globals.x_end}\n")  # Update it
-                else:
-                    file.write(line)  # Keep other lines unchanged
+        x_end = int(np.min(nonzero_coords[:, 1]))
 
-        print("Updated x_end in globals.py:", globals.x_end)
+        # Persisted by the calibration store, only written when it changed
+        if calibration.set(camera or 'main', 'x_end', x_end):
+            print("Updated x_end calibration:", x_end)
 
     # Apply the mask on the cropped image using bitwise operation
     masked_image = cv2.bitwise_and(image, image, mask=mask_layer)
 
+    if return_location:
+        return masked_image, corrected_top_left
     return masked_image
 
 def center_detect_small_dots_and_contours(masked_region):
 
-    # Threshold the masked region
-    _, thresh = cv2.threshold(masked_region, 100, 255, cv2.THRESH_BINARY)
+    # Threshold the masked region and extract the non-zero area dots
+    blobs = extract_blobs(masked_region, DOT_THRESHOLD, min_area=0, mode=BLOB_EXTRACTION_MODE)
+    centers = blobs.centers.astype(np.int32)  # Truncates like int()
 
-    # Detect contours
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # Store dot positions and areas (X, Y, 0, Area)
+    dot_area_column_mapping = [(cX, cY, 0, area) for (cX, cY), area in zip(centers.tolist(), blobs.areas.tolist())]
 
-    # Store dot positions and areas
-    dot_area_column_mapping = []  # List to store dot data
+    # Draw the dots and annotate them
     annotated_dots = cv2.cvtColor(masked_region, cv2.COLOR_GRAY2BGR)
-
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if area > 0:  # Only consider non-zero area contours
-            # Compute the center of the dot
-            M = cv2.moments(contour)
-            if M["m00"] != 0:
-                cX = int(M["m10"] / M["m00"])
-                cY = int(M["m01"] / M["m00"])
-
-                # Append to the structured list (X, Y, 0, Area)
-                dot_area_column_mapping.append((cX, cY, 0, area))
-
-                # Draw the dot and annotate it
-                cv2.drawContours(annotated_dots, [contour], -1, (0, 255, 0), 1)
-                cv2.putText(annotated_dots, f"{area:.1f}", (cX, cY), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
-    df = pd.DataFrame(dot_area_column_mapping, columns=['X', 'Y', 'Column', 'Area'])
-    df.to_csv('dot_areas_with_columns.csv', index=False)
+    if blobs.contours is not None:
+        cv2.drawContours(annotated_dots, blobs.contours, -1, (0, 255, 0), 1)
+    for cX, cY, _, area in dot_area_column_mapping:
+        cv2.putText(annotated_dots, f"{area:.1f}", (cX, cY), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+    result_log.append('center_circle', dot_area_column_mapping, barcode=globals.latest_barcode)
     return dot_area_column_mapping, annotated_dots
 
 
 
 #PROCESS CENTER CAMERA - SLICE
 
-def process_inner_slice(image):
+def process_inner_slice(image, camera='main', dot_map=None, return_region=False):
+    """
+    The dots [[x, y, column, area], ...] of the inner slice. With `return_region`, also the
+    masked polygon region their coordinates refer to, as (dots, region).
+    """
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    template_path = os.path.join(script_dir, 'templ03_mod3.jpg')
-    template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+    template = template_store.get_template('templ03_mod3.jpg')
 
     if image is None or template is None:
         raise FileNotFoundError("Target or template image not found. Check the file paths.")
@@ -235,78 +553,85 @@ def process_inner_slice(image):
     # Step 1: Crop the input image
 
     # Step 2: Match and extract the template region
-    matched_region = center_template_match_and_extract(template, image)
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    template_path = os.path.join(script_dir, 'templ08_c.jpg')
-    template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+    matched_region, circle_top_left = center_template_match_and_extract(template, image, template_name='templ03_mod3.jpg',
+                                                                        camera=camera, return_location=True)
+    circle_height, circle_width = template.shape
+    template = template_store.get_template('templ08_c.jpg')
 
     if image is None or template is None:
         raise FileNotFoundError("Target or template image not found. Check the file paths.")
         # Step 1: Crop the input image
-    cropped_image = islice_crop_second_two_thirds(image)
+    cropped_image = islice_crop_second_two_thirds(image, camera)
     # Step 2: Match the polygonal template and extract the masked region
-    polygon_region = islice_template_match_with_polygon(cropped_image, template)
-    globals.latest_image = polygon_region
-    
+    polygon_region, polygon_top_left = islice_template_match_with_polygon(cropped_image, template,
+                                                                          template_name='templ08_c.jpg',
+                                                                          camera=camera, return_location=True)
+
+    # The tablet center is the center of the matched center circle, in polygon region coordinates
+    polar_center = (circle_top_left[0] + circle_width / 2 - polygon_top_left[0],
+                    circle_top_left[1] + circle_height / 2 - polygon_top_left[1])
+
+    # Registration mode: measure at the positions of the reference dot map
+    if dot_map is not None:
+        dot_contours = measure_with_dot_map(polygon_region, dot_map, min_area=1, center_mode=SLICE_BLOB_CENTER_MODE)
+        if dot_contours is not None:
+            return (dot_contours, polygon_region) if return_region else dot_contours
+
     # Step 3: Detect small dots in the polygon region
-    dot_contours, annotated_dots, grouped_x = islice_detect_small_dots_and_contours(polygon_region)
+    dot_contours, annotated_dots, grouped_x = islice_detect_small_dots_and_contours(polygon_region,
+                                                                                    polar_center=polar_center)
 
     # Define the filename with timestamp
     timestamp = time.strftime("%Y%m%d_%H%M%S")
     filename = f"result_pizza_{timestamp}.jpg"
     # Save the image in the script directory
-    cv2.imwrite(os.path.join(script_dir, filename), annotated_dots)
+    image_writer.submit(os.path.join(script_dir, filename), annotated_dots)
+    if SAVE_POLAR_VIEW:
+        image_writer.submit(os.path.join(script_dir, f"result_pizza_polar_{timestamp}.jpg"),
+                            annotated_dots, polar_unwrap, polar_center)
 
     #print(dot_contours)
-    return dot_contours
+    return (dot_contours, polygon_region) if return_region else dot_contours
 
-def islice_crop_second_two_thirds(image):
-    print(globals.x_end)
-    cropped_image = image[:, :globals.x_end]
+def islice_crop_second_two_thirds(image, camera='main'):
+    x_end = calibration.get(camera, 'x_end', globals.x_end)
+    print(x_end)
+    cropped_image = image[:, :x_end]
     return cropped_image
 
-def islice_template_match_with_polygon(cropped_image, template, start_x=0, start_y=0):
-
-    best_match = None
-    best_max_val = -1
-    best_top_left = None
-    result = cv2.matchTemplate(cropped_image, template, cv2.TM_CCOEFF_NORMED)
-    _, max_val, _, max_loc = cv2.minMaxLoc(result)
-
-    if max_val > best_max_val:
-            best_max_val = max_val
-            best_match = template
-            best_top_left = (max_loc[0] + start_x, max_loc[1] + start_y)  # Offset by search region
+def islice_template_match_with_polygon(cropped_image, template, start_x=0, start_y=0,
+                                       template_name=None, kernel_size=ISLICE_MASK_KERNEL,
+                                       pyramid_factor=TEMPLATE_MATCH_PYRAMID_FACTOR, camera=None,
+                                       return_location=False):
+    """
+    Matches the polygonal slice template and returns the matched region masked with the
+    dilated template shape (and its top left corner with `return_location`). The masks come
+    from the TemplateStore when `template_name` is given, so a frame only costs the match and
+    one bitwise_and.
+    """
+    max_val, max_loc = template_match(cropped_image, template, template_name, pyramid_factor, camera=camera)
 
     # Validate the best match
-    if best_max_val < 0:  # Adjust threshold for confidence
+    if max_val < 0:  # Adjust threshold for confidence
         raise ValueError("Template match confidence is too low.")
 
     # Get the region where the template matches
-    best_template_height, best_template_width = best_match.shape
-    top_left = best_top_left
-    bottom_right = (top_left[0] + best_template_width, top_left[1] + best_template_height)
+    template_height, template_width = template.shape
+    top_left = (max_loc[0] + start_x, max_loc[1] + start_y)  # Offset by search region
+    bottom_right = (top_left[0] + template_width, top_left[1] + template_height)
     matched_region = cropped_image[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]]
 
-    # Create the original binary mask (1 inside, 0 outside)
-    original_mask = np.zeros_like(best_match, dtype=np.uint8)
-    original_mask[best_match > 10] = 1  # Threshold only the mask, NOT the image
-
-    # **Step 1: Expand the mask by 15 pixels**
-    kernel = np.ones((35, 35), np.uint8)  # 15 pixels in each direction (total size 31x31)
-    expanded_mask = cv2.dilate(original_mask, kernel, iterations=1)
-
-    # **Step 2: Create the 15-pixel white boundary**
-    boundary_mask = expanded_mask - original_mask  # Subtract original to get only boundary
-
-    # **Step 3: Set boundary to white (255), and keep the original mask as 1**
-    final_mask = np.copy(expanded_mask)
-    final_mask[boundary_mask == 1] = 255  # Set boundary pixels to white
-    final_mask[original_mask == 1] = 1  # Keep the original mask as 1
+    # Template shape expanded by the dilation kernel
+    if template_name is not None:
+        expanded_mask, _ = template_store.get_polygon_masks(template_name, kernel_size)
+    else:
+        expanded_mask, _ = template_store.build_polygon_masks(template, kernel_size)
 
-    # **Apply the final mask to the matched region**
+    # **Apply the expanded mask to the matched region**
     masked_polygon_region = cv2.bitwise_and(matched_region, matched_region, mask=expanded_mask)
 
+    if return_location:
+        return masked_polygon_region, top_left
     return masked_polygon_region
 
 
@@ -314,37 +639,10 @@ def generate_gradient_colors(n):
     colormap = plt.cm.get_cmap('jet', n)
     return [(int(255 * r), int(255 * g), int(255 * b)) for r, g, b, _ in colormap(np.linspace(0, 1, n))]
 
-def islice_detect_small_dots_and_contours(masked_region, x_threshold=40):
-
-    # Apply threshold to find dots
-    _, thresh = cv2.threshold(masked_region, 100, 255, cv2.THRESH_BINARY)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    # **Extract dot centers and filter out zero-area contours**
-    dot_centers = []
-    dot_areas = []
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if area > 1:  # Ignore zero-area dots
-            (x, y), _ = cv2.minEnclosingCircle(contour)
-            dot_centers.append((int(x), int(y)))
-            dot_areas.append(area)
-    dot_centers = np.array(dot_centers, dtype=np.int32)
-    if len(dot_centers) < 2:
-        print("Not enough dots for clustering.")
-        return dot_centers, masked_region, {}
-
-    # **Step 1: Sort dots by X-coordinate (left to right), then by Y-coordinate**
-    sorted_indices = np.lexsort((-dot_centers[:, 1], -dot_centers[:, 0]))  # Reverse X and Y sorting
-    dot_centers = dot_centers[sorted_indices]
-    dot_areas = np.array(dot_areas)[sorted_indices]
-    # **Identify Rows & Exclude Last Two Rows**
-    unique_y_values = np.unique(dot_centers[:, 1])  # Unique Y-coordinates (row positions)
-    if len(unique_y_values) > 2:
-        excluded_rows = unique_y_values[-2:]  # Last two unique Y-values
-        mask = ~np.isin(dot_centers[:, 1], excluded_rows)  # Mask to filter out last two rows
-        dot_centers = dot_centers[mask]
-        dot_areas = dot_areas[mask]
-
+def _islice_cluster_columns_legacy(dot_centers, dot_areas, x_threshold):
+    """
+    Reference implementation of the inner slice column clustering, see _islice_cluster_columns.
+    """
     # **Step 2: Iteratively find columns**
     columns = []
     column_labels = {}
@@ -521,8 +819,6 @@ def islice_detect_small_dots_and_contours(masked_region, x_threshold=40):
     column_dot_counts = {col_idx: sum(1 for _, _, col, _ in filtered_dot_area_column_mapping if col == col_idx) for
                          col_idx in valid_column_indices}
 
-    # **Step 8: Annotate the image (excluding last two columns)**
-    annotated_dots = cv2.cvtColor(masked_region, cv2.COLOR_GRAY2BGR)
     # Step 1: Identify the correct numbering for missing columns
     missing_column_replacements = {}
     cumulative_shift = 0  # Tracks the total number of missing columns added so far
@@ -550,6 +846,330 @@ def islice_detect_small_dots_and_contours(masked_region, x_threshold=40):
         (x, y, updated_mapping.get(x, col), area) for x, y, col, area in filtered_dot_area_column_mapping
     ], key=lambda row: row[0])
 
+    return filtered_dot_area_column_mapping, column_dot_counts, missing_columns, num_columns
+
+
+def _islice_cluster_columns(dot_centers, dot_areas, x_threshold):
+    """
+    Groups the inner slice dots into columns and inserts the missing columns.
+
+    `dot_centers` / `dot_areas` must be sorted by X then Y, both descending. Starting from the
+    rightmost dot, every dot within `x_threshold` of it forms a column, then the next remaining
+    dot starts the next one. As the dots are sorted, every column is a contiguous run found with
+    one searchsorted. The last 5 columns are dropped, the others numbered from 1 (rightmost).
+    Gaps larger than 1.5 times the median column spacing get missing columns (x, -1, col, 0)
+    and the columns left of a gap are renumbered past it.
+
+    Returns:
+        (list, dict, list, int): the (x, y, col, area) entries sorted by X, the dot count per
+            column index before the missing columns were numbered, the X of the missing columns
+            and the number of detected columns.
+        None if a missing column lands on the X of a detected dot, that case is left to
+            _islice_cluster_columns_legacy.
+    """
+    x = dot_centers[:, 0].astype(np.int64)
+    y = dot_centers[:, 1].astype(np.int64)
+    n = len(x)
+
+    # **Step 2: Find the columns as runs of the X-descending order**
+    negated_x = -x
+    column_starts = []
+    start = 0
+    while start < n:
+        column_starts.append(start)
+        start = int(np.searchsorted(negated_x, negated_x[start] + x_threshold, side='right'))
+    column_starts = np.array(column_starts, dtype=np.int64)
+    column_ends = np.append(column_starts[1:], n)
+    num_columns = len(column_starts)
+    dot_columns = np.repeat(np.arange(num_columns), column_ends - column_starts)
+
+    # **Step 3: Remove the last 5 columns**
+    num_valid = max(num_columns - 5, 0) if num_columns > 2 else num_columns
+    kept = dot_columns < num_valid
+    kept_x, kept_y, kept_areas, kept_columns = x[kept], y[kept], dot_areas[kept], dot_columns[kept]
+
+    if n > 0 and x[0] < 2600:
+        print("The first column is missing!")
+
+    # **Step 3.1: Detect missing columns by analyzing spacing**
+    # Leftmost X of every column (the last dot of its run), from left to right
+    column_x_positions = x[column_ends[:num_valid] - 1][::-1]
+    missing_counts = np.zeros(max(num_valid - 1, 0), dtype=np.int64)
+    median_spacing = 0
+    if num_valid > 1:
+        column_distances = np.diff(column_x_positions)
+        median_spacing = np.median(column_distances)
+        large_gaps = column_distances > 1.5 * median_spacing
+        missing_counts[large_gaps] = np.round(column_distances[large_gaps] / median_spacing).astype(np.int64) - 1
+    # Missing columns left of every detected column (in left to right order)
+    shifts = np.concatenate(([0], np.cumsum(missing_counts)))
+
+    gap_index = np.repeat(np.arange(len(missing_counts)), missing_counts)
+    gap_offset = np.arange(len(gap_index)) - np.repeat(shifts[:-1], missing_counts)  # j - 1 within its gap
+    missing_columns = (column_x_positions[gap_index]
+                       + ((gap_offset + 1) * median_spacing).astype(np.int64)) if len(gap_index) else gap_index
+    if np.isin(missing_columns, kept_x).any():
+        return None
+
+    for missing_x, i in zip(missing_columns.tolist(), gap_index.tolist()):
+        left_col, right_col = column_x_positions[i], column_x_positions[i + 1]
+        print(f"Missing column at X={missing_x} is between column {num_valid - i} (X={left_col}) "
+              f"and column {num_valid - i - 1} (X={right_col})")
+
+    # **Step 4: Number the columns**
+    # Detected column c sits at left-to-right position num_valid - 1 - c, it is numbered c + 1
+    # plus one for every missing column left of it. A missing column continues the numbering
+    # of the detected column right of its gap.
+    position = num_valid - 1 - kept_columns
+    kept_labels = kept_columns + 1 + shifts[position]
+    missing_labels = num_valid - gap_index + 1 + gap_offset + shifts[gap_index]
+
+    # Dot counts per column index, with the missing columns still numbered after the detected ones
+    missing_first_labels = num_valid + 1 + 2 * np.arange(len(missing_columns))
+    counted = np.bincount(np.concatenate((kept_labels, missing_first_labels)), minlength=num_valid + 1)
+    column_dot_counts = {col_idx: int(counted[col_idx]) for col_idx in range(num_valid)}
+
+    # Entries sorted by X, dots keep their Y-descending order and come before missing columns
+    all_x = np.concatenate((kept_x, missing_columns))
+    order = np.argsort(all_x, kind='stable')
+    entries = (list(zip(kept_x.tolist(), kept_y.tolist(), kept_labels.tolist(), kept_areas.tolist()))
+               + [(missing_x, -1, label, 0) for missing_x, label in zip(missing_columns.tolist(), missing_labels.tolist())])
+    filtered_dot_area_column_mapping = [entries[i] for i in order.tolist()]
+
+    return filtered_dot_area_column_mapping, column_dot_counts, missing_columns.tolist(), num_columns
+
+
+def _islice_cluster_columns_lattice(dot_centers, dot_areas, x_threshold):
+    """
+    Lattice variant of _islice_cluster_columns: fits the column grid once (dot_lattice) and
+    snaps every dot to its lattice column. Columns are numbered from the rightmost occupied
+    lattice column (1), so the empty lattice columns between detected ones are the missing
+    columns (x, -1, col, 0) and keep the numbering stable. Empty cells inside a column, more
+    than 1.5 row pitches between two detected dots, are reported as missing dots (x, y, col, 0).
+    Like the other variants the 5 leftmost detected columns are dropped.
+
+    Returns the same as _islice_cluster_columns (the dot counts are per column number),
+    or None if the dots do not fit a regular grid.
+    """
+    x = dot_centers[:, 0]
+    y = dot_centers[:, 1]
+    lattice = fit_column_lattice(x, y, x_threshold)
+    if lattice is None:
+        return None
+
+    lattice_columns, _ = lattice.columns(x, y)
+    occupied = np.unique(lattice_columns)  # Left to right
+    num_columns = len(occupied)
+    num_valid = max(num_columns - 5, 0) if num_columns > 2 else num_columns
+    if num_valid == 0:
+        return [], {}, [], num_columns
+
+    # **Number the columns from the rightmost one, drop the leftmost ones**
+    rightmost, leftmost_kept = occupied[-1], occupied[num_columns - num_valid]
+    kept = lattice_columns >= leftmost_kept
+    kept_x, kept_y, kept_areas = x[kept], y[kept], np.asarray(dot_areas)[kept]
+    kept_columns = lattice_columns[kept]
+    kept_labels = rightmost - kept_columns + 1
+
+    _, kept_v = lattice.rotate(kept_x, kept_y)
+    reference_v = float(np.median(kept_v))
+
+    # **Missing columns: empty lattice columns between the kept ones**
+    empty_columns = np.setdiff1d(np.arange(leftmost_kept, rightmost + 1), occupied)
+    missing_x, _ = lattice.unrotate(lattice.phase + empty_columns * lattice.spacing,
+                                    np.full(len(empty_columns), reference_v))
+    missing_columns = missing_x.astype(np.int64)
+    missing_labels = rightmost - empty_columns + 1
+    for missing, label in zip(missing_columns.tolist(), missing_labels.tolist()):
+        print(f"Missing column at X={missing} is column {label}")
+
+    # **Missing dots: gaps of more than 1.5 row pitches inside a column**
+    missing_dot_x = missing_dot_y = missing_dot_labels = np.empty(0, dtype=np.int64)
+    if lattice.row_pitch:
+        order = np.lexsort((kept_v, kept_columns))
+        steps = np.diff(kept_v[order])
+        in_column = np.diff(kept_columns[order]) == 0
+        gaps = np.flatnonzero(in_column & (steps > 1.5 * lattice.row_pitch))
+        counts = np.round(steps[gaps] / lattice.row_pitch).astype(np.int64) - 1
+        gap_of = np.repeat(gaps, counts)
+        slot = np.arange(len(gap_of)) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+        v = kept_v[order][gap_of] + slot * steps[gap_of] / np.repeat(counts + 1, counts)
+        columns_of = kept_columns[order][gap_of]
+        dot_x, dot_y = lattice.unrotate(lattice.phase + columns_of * lattice.spacing, v)
+        missing_dot_x, missing_dot_y = dot_x.astype(np.int64), dot_y.astype(np.int64)
+        missing_dot_labels = rightmost - columns_of + 1
+
+    labels, counts = np.unique(kept_labels, return_counts=True)
+    column_dot_counts = dict(zip(labels.tolist(), counts.tolist()))
+
+    entries = (list(zip(kept_x.tolist(), kept_y.tolist(), kept_labels.tolist(), kept_areas.tolist()))
+               + [(missing, -1, label, 0) for missing, label in zip(missing_columns.tolist(), missing_labels.tolist())]
+               + list(zip(missing_dot_x.tolist(), missing_dot_y.tolist(), missing_dot_labels.tolist(),
+                          [0] * len(missing_dot_x))))
+    all_x = np.concatenate((kept_x, missing_columns, missing_dot_x))
+    order = np.argsort(all_x, kind='stable')
+    filtered_dot_area_column_mapping = [entries[i] for i in order.tolist()]
+
+    return filtered_dot_area_column_mapping, column_dot_counts, missing_columns.tolist(), num_columns
+
+
+def image_to_polar(xs, ys, center):
+    """
+    Angle (degrees in [0, 360), measured like cv2.warpPolar: from +X towards +Y) and radius of
+    image points around `center`.
+    """
+    dx = np.asarray(xs, dtype=np.float64) - center[0]
+    dy = np.asarray(ys, dtype=np.float64) - center[1]
+    return np.degrees(np.arctan2(dy, dx)) % 360, np.hypot(dx, dy)
+
+
+def polar_to_image(angles, radii, center):
+    """
+    Image (x, y) of polar points around `center`, the inverse of image_to_polar.
+    """
+    theta = np.radians(np.asarray(angles, dtype=np.float64))
+    radii = np.asarray(radii, dtype=np.float64)
+    return center[0] + radii * np.cos(theta), center[1] + radii * np.sin(theta)
+
+
+def polar_unwrap(image, center, max_radius=None, angle_bins=POLAR_ANGLE_BINS):
+    """
+    The image unwrapped around `center` with cv2.warpPolar and transposed, so the radial dot
+    columns are vertical bands: image column a is the angle a * 360 / angle_bins, row r the
+    radius r px. The default radius reaches the farthest image corner.
+    """
+    height, width = image.shape[:2]
+    if max_radius is None:
+        corners_x, corners_y = np.array([0, width, 0, width]), np.array([0, 0, height, height])
+        max_radius = float(np.max(np.hypot(corners_x - center[0], corners_y - center[1])))
+    polar = cv2.warpPolar(image, (int(np.ceil(max_radius)), angle_bins), (float(center[0]), float(center[1])),
+                          max_radius, cv2.WARP_POLAR_LINEAR + cv2.INTER_LINEAR)
+    return cv2.transpose(polar)
+
+
+def _islice_cluster_columns_polar(dot_centers, dot_areas, x_threshold, center):
+    """
+    Polar variant of _islice_cluster_columns: the dot columns run radially from the tablet
+    `center`, so instead of X the dots are grouped by their angle around it (image_to_polar,
+    the point mapping of polar_unwrap). The columns are runs of occupied bins of a 1-D angle
+    histogram, occupied bins less than half `x_threshold` (as arc length at the median radius)
+    apart belong to one column.
+
+    Columns are numbered from the rightmost one (1), the 5 leftmost are dropped. Angular gaps
+    larger than 1.5 times the median column pitch get missing columns (x, -1, col, 0), with x
+    on the median radius, and the columns left of a gap are numbered past it.
+
+    Returns the same as _islice_cluster_columns (the dot counts are per column number).
+    """
+    x = dot_centers[:, 0].astype(np.int64)
+    y = dot_centers[:, 1].astype(np.int64)
+    angles, radii = image_to_polar(x, y, center)
+
+    # Unwrap at the largest empty angle, the slice never covers the whole circle
+    ordered = np.sort(angles)
+    gaps = np.diff(np.append(ordered, ordered[0] + 360))
+    origin = ordered[(int(np.argmax(gaps)) + 1) % len(ordered)]
+    angles = (angles - origin) % 360
+    reference_radius = float(np.median(radii))
+
+    # **Step 1: 1-D histogram over the angle, runs of occupied bins are the columns**
+    merge_bins = max(1, int(np.degrees(x_threshold / 2 / reference_radius) / POLAR_HISTOGRAM_BIN))
+    bins = (angles / POLAR_HISTOGRAM_BIN).astype(np.int64)
+    occupied = np.flatnonzero(np.bincount(bins))
+    bin_columns = np.concatenate(([0], np.cumsum(np.diff(occupied) > merge_bins)))
+    column_of_bin = np.zeros(occupied[-1] + 1, dtype=np.int64)
+    column_of_bin[occupied] = bin_columns
+    dot_columns = column_of_bin[bins]  # 0 is the smallest angle
+    num_columns = int(bin_columns[-1]) + 1
+    dots_per_column = np.bincount(dot_columns, minlength=num_columns)
+    column_angles = np.bincount(dot_columns, weights=angles, minlength=num_columns) / dots_per_column
+
+    # **Step 2: Rank the columns from right to left, drop the 5 leftmost**
+    column_x = np.bincount(dot_columns, weights=x, minlength=num_columns) / dots_per_column
+    if column_x[0] >= column_x[-1]:
+        rank = dot_columns  # The angle grows to the left
+    else:
+        rank = num_columns - 1 - dot_columns
+        column_angles = column_angles[::-1]
+    num_valid = max(num_columns - 5, 0) if num_columns > 2 else num_columns
+    kept = rank < num_valid
+    kept_x, kept_y, kept_areas, kept_rank = x[kept], y[kept], np.asarray(dot_areas)[kept], rank[kept]
+
+    # **Step 3: Missing columns in the angular gaps**
+    ranked_angles = column_angles[:num_valid]
+    missing_counts = np.zeros(max(num_valid - 1, 0), dtype=np.int64)
+    steps = np.diff(ranked_angles)
+    if num_valid > 1:
+        pitch = np.median(np.abs(steps))
+        large_gaps = np.abs(steps) > 1.5 * pitch
+        missing_counts[large_gaps] = np.round(np.abs(steps[large_gaps]) / pitch).astype(np.int64) - 1
+    shifts = np.concatenate(([0], np.cumsum(missing_counts)))
+
+    gap_index = np.repeat(np.arange(len(missing_counts)), missing_counts)
+    gap_offset = np.arange(len(gap_index)) - np.repeat(shifts[:-1], missing_counts)
+    missing_angles = (ranked_angles[gap_index]
+                      + (gap_offset + 1) * steps[gap_index] / (missing_counts[gap_index] + 1))
+    missing_x, _ = polar_to_image(missing_angles + origin, np.full(len(gap_index), reference_radius), center)
+    missing_columns = missing_x.astype(np.int64)
+
+    # **Step 4: Number the columns, past the missing columns right of them**
+    kept_labels = kept_rank + 1 + shifts[kept_rank]
+    missing_labels = gap_index + 2 + shifts[gap_index] + gap_offset
+    for missing, label in zip(missing_columns.tolist(), missing_labels.tolist()):
+        print(f"Missing column at X={missing} is column {label}")
+
+    labels, counts = np.unique(kept_labels, return_counts=True)
+    column_dot_counts = dict(zip(labels.tolist(), counts.tolist()))
+
+    entries = (list(zip(kept_x.tolist(), kept_y.tolist(), kept_labels.tolist(), kept_areas.tolist()))
+               + [(missing, -1, label, 0) for missing, label in zip(missing_columns.tolist(), missing_labels.tolist())])
+    order = np.argsort(np.concatenate((kept_x, missing_columns)), kind='stable')
+    filtered_dot_area_column_mapping = [entries[i] for i in order.tolist()]
+
+    return filtered_dot_area_column_mapping, column_dot_counts, missing_columns.tolist(), num_columns
+
+
+def islice_detect_small_dots_and_contours(masked_region, x_threshold=40, clustering=ISLICE_CLUSTERING,
+                                          polar_center=None):
+
+    # Apply threshold to find dots
+    # **Extract dot centers and filter out zero-area dots**
+    blobs = extract_blobs(masked_region, DOT_THRESHOLD, min_area=1, mode=BLOB_EXTRACTION_MODE,
+                          center_mode=SLICE_BLOB_CENTER_MODE)
+    dot_centers = blobs.centers.astype(np.int32)  # Truncates like int()
+    dot_areas = blobs.areas
+    if len(dot_centers) < 2:
+        print("Not enough dots for clustering.")
+        return dot_centers, masked_region, {}
+
+    # **Step 1: Sort dots by X-coordinate (left to right), then by Y-coordinate**
+    sorted_indices = np.lexsort((-dot_centers[:, 1], -dot_centers[:, 0]))  # Reverse X and Y sorting
+    dot_centers = dot_centers[sorted_indices]
+    dot_areas = np.array(dot_areas)[sorted_indices]
+    # **Identify Rows & Exclude Last Two Rows**
+    unique_y_values = np.unique(dot_centers[:, 1])  # Unique Y-coordinates (row positions)
+    if len(unique_y_values) > 2:
+        excluded_rows = unique_y_values[-2:]  # Last two unique Y-values
+        mask = ~np.isin(dot_centers[:, 1], excluded_rows)  # Mask to filter out last two rows
+        dot_centers = dot_centers[mask]
+        dot_areas = dot_areas[mask]
+
+    # **Step 2: Group the dots into columns and insert the missing ones**
+    clustered = None
+    if clustering == "polar" and polar_center is not None:
+        clustered = _islice_cluster_columns_polar(dot_centers, dot_areas, x_threshold, polar_center)
+    if clustering == "lattice":
+        clustered = _islice_cluster_columns_lattice(dot_centers, dot_areas, x_threshold)
+        if clustered is None:
+            print("Dots do not fit a regular lattice, clustering by X instead.")
+    if clustered is None and clustering in ("vectorized", "lattice", "polar"):
+        clustered = _islice_cluster_columns(dot_centers, dot_areas, x_threshold)
+    if clustered is None:
+        clustered = _islice_cluster_columns_legacy(dot_centers, dot_areas, x_threshold)
+    filtered_dot_area_column_mapping, column_dot_counts, missing_columns, num_columns = clustered
+
+    # **Step 8: Annotate the image (excluding last two columns)**
+    annotated_dots = cv2.cvtColor(masked_region, cv2.COLOR_GRAY2BGR)
     valid_column_indices2 = set(range(min(51, num_columns)))
     # **Step 5: Assign colors to columns**
     colors = generate_gradient_colors(len(valid_column_indices2))
@@ -571,40 +1191,24 @@ def islice_detect_small_dots_and_contours(masked_region, x_threshold=40):
             # Display column number near the dot
             cv2.putText(annotated_dots, f"Col {col_label}", (x - 10, y + 10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)  # White text for column
-        # **Step 8.1: Highlight Missing Columns**
+    # **Step 8.1: Highlight Missing Columns** (on top of the dots)
+    if filtered_dot_area_column_mapping:
+        # Label the missing columns
         for x_missing in missing_columns:
-            height = annotated_dots.shape[0]  # Get image height for full vertical line
-            for y in range(0, height, 10):  # Draw dashed lines (10px spacing)
-                if y % 20 == 0:
-                    cv2.line(annotated_dots, (x_missing, y), (x_missing, y + 10), (0, 0, 255), 2)  # Red dashed line
-
-            # Label the missing column
             cv2.putText(annotated_dots, "MISSING", (x_missing - 20, 20),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)  # Red text for missing columns
-        # **Step 9: Save dot areas with column numbers (excluding last two columns)**
-        # Define the column names
-    columns = ['X', 'Y', 'Column', 'Area']
+        for x_missing in missing_columns:
+            height = annotated_dots.shape[0]  # Get image height for full vertical line
+            for y in range(0, height, 20):  # Draw dashed lines (10px dashes, 10px spacing)
+                cv2.line(annotated_dots, (x_missing, y), (x_missing, y + 10), (0, 0, 255), 2)  # Red dashed line
+    # **Step 9: Save dot areas with column numbers (excluding last two columns)**
     filtered_dot_area_column_mapping2 = [
         (x, y, col_label, area)
         for (x, y, col_label, area) in filtered_dot_area_column_mapping
         if col_label in valid_column_indices2
     ]
-    # Convert filtered_dot_area_column_mapping to a DataFrame
-    new_data = pd.DataFrame(filtered_dot_area_column_mapping2, columns=columns)
-
-    # Check if the file already exists
-    file_path = 'dot_areas_with_columns.csv'
-    if os.path.exists(file_path):
-        # If the file exists, read it
-        existing_data = pd.read_csv(file_path)
-        # Append the new data to the existing data
-        updated_data = pd.concat([existing_data, new_data], ignore_index=True)
-    else:
-        # If the file doesn't exist, use the new data as the dataset
-        updated_data = new_data
-
-    # Save the updated data back to CSV
-    updated_data.to_csv(file_path, index=False)
+    # Appended to the result log as a new partition, the history is never read back
+    result_log.append('center_slice', filtered_dot_area_column_mapping2, barcode=globals.latest_barcode)
     # for i, dot in enumerate(filtered_dot_area_column_mapping2):
     #    print(f"Dot {i + 1}: X = {dot[0]}, Y = {dot[1]}, Column = {dot[2]}, Area = {dot[3]}")
     # Extract column labels
@@ -621,25 +1225,41 @@ def islice_detect_small_dots_and_contours(masked_region, x_threshold=40):
 
 
 #PROCESS SIDE CAMERA - SLICE
-def start_side_slice(image):
+def start_side_slice(image, camera='side', dot_map=None, return_region=False):
+    """
+    The dots [[x, y, column, area], ...] of the outer slice. With `return_region`, also the
+    masked polygon region their coordinates refer to, as (dots, region).
+    """
     cropped_image =  image
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    template_path = os.path.join(script_dir, 'templ05_mod2.jpg')
-    template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+    template = template_store.get_template('templ05_mod2.jpg')
 
-    polygon_region, annotated_image, polygon_mask = template_match_with_polygon(cropped_image, template)
+    polygon_region, annotated_image, polygon_mask = template_match_with_polygon(cropped_image, template,
+                                                                                template_name='templ05_mod2.jpg',
+                                                                                camera=camera)
 
+    # Registration mode: measure at the positions of the reference dot map
+    if dot_map is not None:
+        dot_contours = measure_with_dot_map(polygon_region, dot_map, min_area=1, center_mode=SLICE_BLOB_CENTER_MODE)
+        if dot_contours is not None:
+            return (dot_contours, polygon_region) if return_region else dot_contours
 
     # Step 3: Detect small dots in the polygon region
-    dot_contours, annotated_dots, grouped_x,matching_column = detect_small_dots_and_contours(polygon_region)
-
-    return dot_contours
+    dot_contours, grouped_x, matching_column = detect_small_dots_and_contours(polygon_region)
 
+    return (dot_contours, polygon_region) if return_region else dot_contours
 
 
 
-def template_match_with_polygon(cropped_image, template):
 
+def template_match_with_polygon(cropped_image, template, template_name=None, kernel_size=SIDE_MASK_KERNEL,
+                                pyramid_factor=TEMPLATE_MATCH_PYRAMID_FACTOR, camera=None, annotate=False):
+    """
+    Matches the polygonal side slice template and returns the matched region masked with
+    the dilated template shape, an annotated copy of the search image (only with `annotate`,
+    None otherwise, it is a full resolution color copy) and the final mask
+    (1 inside the template, 255 on the dilated boundary). At the native template scale the
+    masks come from the TemplateStore when `template_name` is given.
+    """
 
     if template is None:
         raise FileNotFoundError(f"Template not found at {template}")
@@ -653,9 +1273,13 @@ def template_match_with_polygon(cropped_image, template):
     # Multi-scale template matching
     scales = np.linspace(1, 1.2, 1)  # Adjust scales to search (e.g., 84% to 100%)
     for scale in scales:
-        resized_template = cv2.resize(template, (int(template_width * scale), int(template_height * scale)))
-        result = cv2.matchTemplate(cropped_image, resized_template, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if scale == 1:
+            resized_template = template
+            max_val, max_loc = template_match(cropped_image, template, template_name, pyramid_factor,
+                                              camera=camera)
+        else:
+            resized_template = cv2.resize(template, (int(template_width * scale), int(template_height * scale)))
+            max_val, max_loc = template_match(cropped_image, resized_template, pyramid_factor=pyramid_factor)
 
         if max_val > best_max_val:
             best_max_val = max_val
@@ -673,32 +1297,23 @@ def template_match_with_polygon(cropped_image, template):
     bottom_right = (top_left[0] + best_template_width, top_left[1] + best_template_height)
     matched_region = cropped_image[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]]
 
-    # Create the original binary mask (1 inside, 0 outside)
-    original_mask = np.zeros_like(best_match, dtype=np.uint8)
-    original_mask[best_match > 10] = 1  # Threshold only the mask, NOT the image
-
-    # **Step 1: Expand the mask by 15 pixels**
-    kernel = np.ones((200, 200), np.uint8)  # 15 pixels in each direction (total size 31x31)
-    expanded_mask = cv2.dilate(original_mask, kernel, iterations=1)
-
-    # **Step 2: Create the 15-pixel white boundary**
-    boundary_mask = expanded_mask - original_mask  # Subtract original to get only boundary
-
-    # **Step 3: Set boundary to white (255), and keep the original mask as 1**
-    final_mask = np.copy(expanded_mask)
-    final_mask[boundary_mask == 1] = 255  # Set boundary pixels to white
-    final_mask[original_mask == 1] = 1    # Keep the original mask as 1
+    # Template shape expanded by the dilation kernel, and the final mask with the boundary band.
+    # The 200x200 dilation is by far the most expensive step, only do it once per template
+    if template_name is not None and best_scale == 1:
+        expanded_mask, final_mask = template_store.get_polygon_masks(template_name, kernel_size)
+    else:
+        expanded_mask, final_mask = template_store.build_polygon_masks(best_match, kernel_size)
 
-    # **Apply the final mask to the matched region**
+    # **Apply the expanded mask to the matched region**
     masked_polygon_region = cv2.bitwise_and(matched_region, matched_region, mask=expanded_mask)
-    
-    globals.latest_image = masked_polygon_region
 
     # Annotate the matched polygon on the cropped image
-    annotated_image = cv2.cvtColor(cropped_image, cv2.COLOR_GRAY2BGR)
-    cv2.rectangle(annotated_image, top_left, bottom_right, (0, 255, 0), 2)
-    cv2.putText(annotated_image, f"Scale: {best_scale:.2f}", (top_left[0], top_left[1] - 10),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+    annotated_image = None
+    if annotate:
+        annotated_image = cv2.cvtColor(cropped_image, cv2.COLOR_GRAY2BGR)
+        cv2.rectangle(annotated_image, top_left, bottom_right, (0, 255, 0), 2)
+        cv2.putText(annotated_image, f"Scale: {best_scale:.2f}", (top_left[0], top_left[1] - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
 
 
 
@@ -707,160 +1322,43 @@ def template_match_with_polygon(cropped_image, template):
 
 
 
-def find_first_column(dot_centers, x_threshold=0):
-    """
-    Finds the first column by identifying the leftmost dots and moving downward,
-    ensuring all dots in the first column belong to the same X range.
-    """
-
-    # Sort dots by X first, then Y (ensures left-to-right processing)
-    dot_centers = dot_centers[np.lexsort((dot_centers[:, 0], dot_centers[:, 1]))]
-
-    # Get the leftmost-topmost dot as the first point
-    first_dot = tuple(dot_centers[0])
-    first_column = [first_dot]
-
-    # Convert remaining dots to a list of tuples for easy processing
-    remaining_dots = [tuple(dot) for dot in dot_centers[1:]]
-
-    # Determine column X width dynamically (average of closest X gaps)
-    x_values = dot_centers[:, 0]
-    x_diffs = np.diff(np.sort(x_values))
-
-    if len(x_diffs) > 0:
-        median_x_gap = np.median(x_diffs[x_diffs > 0])  # Ignore zero gaps
-        separation_threshold = max(15, min(median_x_gap * 2, 60))  # Allow a slightly wider threshold
-        separation_threshold0 = -separation_threshold
-    else:
-        separation_threshold = 30  # Fallback value
-
-    while True:
-        last_dot = first_column[-1]
-        min_y_diff = float('inf')
-        next_dot = None
-
-        x_min, x_max = last_dot[0] + separation_threshold0, last_dot[0] + separation_threshold
-        possible_dots = [
-            dot for dot in remaining_dots
-            if 0 < dot[1] - last_dot[1] <= 3000 and x_min <= dot[0] <= x_max
-        ]
-
-        for dot in possible_dots:
-            y_diff = dot[1] - last_dot[1]
-            if y_diff < min_y_diff:
-                min_y_diff = y_diff
-                next_dot = dot
-
-        if next_dot is None:
-            break  # No more dots to add to this column
-
-        first_column.append(next_dot)
-        remaining_dots.remove(next_dot)
-
-    return np.array(first_column), np.array(remaining_dots)
-
-
-
-
-
-
 def detect_small_dots_and_contours(masked_region, x_threshold=40):
-    # Apply threshold to find dots
-    _, thresh = cv2.threshold(cv2.resize(masked_region, None, fx=1, fy=1, interpolation=cv2.INTER_AREA),
-                             100, 255, cv2.THRESH_BINARY)
-
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    # Extract dot centers and store contour areas
-    dot_centers = []
-    dot_areas = [] # Store contour areas
-    dot_areas2=[]
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if area > 1:  # Ignore very small dots
-            (x, y), _ = cv2.minEnclosingCircle(contour)
-            dot_centers.append((int(x), int(y), int(area)))
-            dot_areas.append(area)  # Store the area
-            dot_areas2.append((int(x), int(y), area))  # Store the area
-
-    dot_centers = np.array(dot_centers, dtype=np.int32)
-    dot_centers2 = np.array(dot_areas2, dtype=np.int32)
+    # Threshold to find dots, ignore very small dots
+    blobs = extract_blobs(masked_region, DOT_THRESHOLD, min_area=1, mode=BLOB_EXTRACTION_MODE,
+                          center_mode=SLICE_BLOB_CENTER_MODE)
+    # Dot centers with their truncated area (x, y, area), and the contour areas
+    dot_centers = np.column_stack((blobs.centers, blobs.areas)).astype(np.int32)
+    dot_areas = blobs.areas.tolist()
 
 
     if len(dot_centers) < 2:
         print("Not enough dots for clustering.")
-        return dot_centers, masked_region, {}, -1
-
-    # **Step 1: Detect All Columns Iteratively**
-    columns = []
-    column_labels = {}
-    column_areas = []  # Store areas per column
-    column_x_positions = []  # Store leftmost X position
-
-    while len(dot_centers) > 0:
-        first_column, remaining_dots = find_first_column(dot_centers, x_threshold)
-
-        col_idx = len(columns)
-        col_area_list = [dot_areas[i] for i, dot in enumerate(dot_centers) if tuple(dot) in first_column]
-        column_areas.append(col_area_list)  # Store areas for each column
-
-        if len(first_column) > 0:
-            leftmost_x = min(first_column, key=lambda d: d[0])[0]  # Get leftmost X position
-            column_x_positions.append(leftmost_x)
-
-        for dot in first_column:
-            column_labels[tuple(dot)] = col_idx
-
-        columns.append(first_column)
-
-        # Sort remaining dots again to prioritize leftmost dots first
-        if remaining_dots.size>0:
-            remaining_dots = np.array(remaining_dots)
-            remaining_dots = remaining_dots[np.argsort(remaining_dots[:, 0])]
-            dot_centers = remaining_dots
-        else:
-            dot_centers = np.array([])
+        return dot_centers, {}, -1
 
+    # **Step 1: Detect All Columns**
+    # Trace every column from its topmost dot downwards (see column_index.ColumnIndex),
+    # the columns are lists of indices into dot_centers
+    columns = [np.array(column_indices, dtype=np.int64)
+               for column_indices in trace_columns(dot_centers[:, 0], dot_centers[:, 1])]
+    num_columns = len(columns)
+    column_lengths = np.array([len(column) for column in columns])
+    column_starts = np.concatenate(([0], np.cumsum(column_lengths)[:-1]))
+    traced = np.concatenate(columns)
 
+    # Leftmost X position of every column
+    column_x_positions = np.minimum.reduceat(dot_centers[traced, 0], column_starts)
 
     # **Step 2: Sort Columns from Left to Right**
-
     sorted_column_indices = np.argsort(column_x_positions)[::-1]  # Reverse the order
-    sorted_columns = [columns[i] for i in sorted_column_indices]  # Reorder columns
-    # Create a mapping from old indices to new sorted indices
-    column_remap = {old_idx: new_idx for new_idx, old_idx in enumerate(sorted_column_indices)}
-
-    # Create a mapping from old indices to new sorted indices
-    column_remap = {old_idx: new_idx for new_idx, old_idx in enumerate(sorted_column_indices)}
-
-    # Update column labels based on the new sorted order
-    new_column_labels = {}
-    for dot, old_col_idx in column_labels.items():
-        new_col_idx = column_remap[old_col_idx]
-        new_column_labels[dot] = new_col_idx  # Assign new column index
-
-    # **Step 6: Annotate All Detected Columns (with Sorted Indices)**
-    annotated_dots = cv2.cvtColor(cv2.resize(masked_region, None, fx=1, fy=1, interpolation=cv2.INTER_AREA),
-                                  cv2.COLOR_GRAY2BGR)
-
-
-
-    data = []
-
-    for col_idx, column_array in enumerate(sorted_columns):  # Loop over each column array in the list
-        for row in column_array:  # Loop over each row within that column array
-            x, y, area = row  # Unpack the row
-            data.append((x, y, col_idx, area))  # Store x, y, col_idx (column index), and area
-
+    sorted_column_dots = [columns[i] for i in sorted_column_indices]
+    sorted_columns = [dot_centers[column] for column in sorted_column_dots]  # Reordered (x, y, area) columns
 
+    # Dots in sorted column order with their sorted column index
+    sorted_dots = np.concatenate(sorted_column_dots)
+    sorted_labels = np.repeat(np.arange(num_columns), column_lengths[sorted_column_indices])
 
     best_match=1
-    # Create an annotated image
-    annotated_dots_sorted = cv2.cvtColor(cv2.resize(masked_region, None, fx=1, fy=1, interpolation=cv2.INTER_AREA),
-                                         cv2.COLOR_GRAY2BGR)
-
-    # Initialize label index starting from 49
 
-    num_columns = len(columns)
     print(f"Total columns detected: {num_columns}")
     all_columns = 77
     starting_column = num_columns - all_columns
@@ -870,43 +1368,31 @@ def detect_small_dots_and_contours(masked_region, x_threshold=40):
     # **Step 5: Assign colors to columns**
     colors = generate_gradient_colors(len(valid_column_indices2))
     column_colors = {col_idx: colors[i] for i, col_idx in enumerate(valid_column_indices2)}
-    for (x, y, col_label, area) in data:
-        if col_label in valid_column_indices2:  # Only annotate valid columns
-            color = column_colors[col_label]
-
-            # Draw dot
-            cv2.circle(annotated_dots_sorted, (x, y), 3, color, -1)
-
-            # Draw enclosing circle
-            cv2.circle(annotated_dots_sorted, (x, y), int(np.sqrt(area / np.pi)), (0, 255, 0), 1)  # Green circle
-
-            # Display dot area near the dot
-            cv2.putText(annotated_dots_sorted, f"{int(area)}", (x + 10, y - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 255), 1)  # Yellow text for area
-
-            # Display column number near the dot
-            cv2.putText(annotated_dots_sorted, f"Col {col_label+add_factor}", (x - 10, y + 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)  # White text for column
-
-    data = []
+    annotated = np.isin(sorted_labels, list(valid_column_indices2))  # Only annotate valid columns
+    annotated_rows = dot_centers[sorted_dots[annotated]].tolist()
+    annotated_labels = sorted_labels[annotated].tolist()
 
     # Start numbering columns from 51
     starting_label = 51
 
-    # Process all columns, but only keep valid ones
-    for new_col_idx, (col_idx, column_array) in enumerate(
-            [(idx, sorted_columns[idx]) for idx in valid_column_indices2]
-    ):
-        new_label = starting_label + new_col_idx  # Assign new labels starting from 51
-        for row in column_array:  # Loop over each row within that column array
-            x, y, area = row  # Unpack the row
-            data.append((x, y, new_label, area))  # Store x, y, new column label, and area
+    # Process all columns, but only keep valid ones (in the iteration order of the set, like
+    # the labels have always been assigned, negative indices count from the last column)
+    kept_columns = [sorted_column_dots[idx] for idx in valid_column_indices2]
+    if kept_columns:
+        kept_dots = np.concatenate(kept_columns)
+        kept_labels = np.repeat(starting_label + np.arange(len(kept_columns)),
+                                [len(column) for column in kept_columns])
+    else:
+        kept_dots = np.empty(0, dtype=np.int64)
+        kept_labels = np.empty(0, dtype=np.int64)
+    kept_rows = dot_centers[kept_dots]
+    data = list(zip(kept_rows[:, 0].tolist(), kept_rows[:, 1].tolist(), kept_labels.tolist(),
+                    kept_rows[:, 2].tolist()))
 
     # print("Filtered & Renumbered Processed Data:", data)
 
-    # Save the filtered data to a CSV file
-    df = pd.DataFrame(data, columns=["X", "Y", "Column_Index", "Area"])
-    df.to_csv("filtered_columns_data.csv", index=False)
+    # Save the filtered data to the result log
+    result_log.append('outer_slice', data, barcode=globals.latest_barcode)
 
         # **Step 8.1: Highlight Missing Columns**
     timestamp = time.strftime("%Y%m%d_%H%M%S")
@@ -915,7 +1401,34 @@ def detect_small_dots_and_contours(masked_region, x_threshold=40):
         # Define the filename with timestamp
     filename = f"result_sidepizza_{timestamp}.jpg"
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    cv2.imwrite(os.path.join(script_dir, filename), annotated_dots_sorted)
-    print("Annotated image saved as 'result_sidepizza.png'.")
+    # **Step 6: Annotate All Detected Columns (with Sorted Indices)**, drawn by the image writer
+    image_writer.submit(os.path.join(script_dir, filename), masked_region, draw_side_columns,
+                        annotated_rows, annotated_labels, column_colors, add_factor)
+    print(f"Annotated image queued as '{filename}'.")
+
+    return data, sorted_columns, best_match
+
+
+def draw_side_columns(masked_region, annotated_rows, annotated_labels, column_colors, add_factor):
+    """
+    The side slice region in color with every annotated dot, its area and its column number.
+    Runs in the image writer, the region is only read.
+    """
+    annotated_dots_sorted = cv2.cvtColor(masked_region, cv2.COLOR_GRAY2BGR)
+    for (x, y, area), col_label in zip(annotated_rows, annotated_labels):
+        color = column_colors[col_label]
+
+        # Draw dot
+        cv2.circle(annotated_dots_sorted, (x, y), 3, color, -1)
+
+        # Draw enclosing circle
+        cv2.circle(annotated_dots_sorted, (x, y), int(np.sqrt(area / np.pi)), (0, 255, 0), 1)  # Green circle
+
+        # Display dot area near the dot
+        cv2.putText(annotated_dots_sorted, f"{int(area)}", (x + 10, y - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 255), 1)  # Yellow text for area
 
-    return data, annotated_dots, sorted_columns, best_match
+        # Display column number near the dot
+        cv2.putText(annotated_dots_sorted, f"Col {col_label+add_factor}", (x - 10, y + 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)  # White text for column
+    return annotated_dots_sorted
@@ -0,0 +1,85 @@
+import threading
+
+# Search window around the last known match location, in full resolution pixels
+TRACKING_PADDING = 48
+# Below this TM_CCOEFF_NORMED score a tracked match is not trusted and the whole frame is searched
+TRACKING_MIN_SCORE = 0.5
+
+
+class LocationTracker:
+    """
+    Remembers where a template was last found, per (template, camera), so the next search can
+    start in a small window around it. Counts how often that window was enough (hit) and how
+    often the whole frame had to be searched (miss).
+    """
+    def __init__(self, padding=TRACKING_PADDING, min_score=TRACKING_MIN_SCORE):
+        self.padding = padding
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._locations = {}  # (template, camera) -> (top-left, score) of the last match
+        self._counters = {}   # (template, camera) -> {"hits": int, "misses": int}
+
+    def last_location(self, key):
+        with self._lock:
+            entry = self._locations.get(key)
+            return entry[0] if entry else None
+
+    def window(self, key, template_shape, image_shape):
+        """
+        The search window (x0, y0, x1, y1) around the last location of `key`, clipped to the
+        image, or None if the template was not found yet.
+        """
+        location = self.last_location(key)
+        if location is None:
+            return None
+
+        template_height, template_width = template_shape
+        image_height, image_width = image_shape[:2]
+        x0 = max(location[0] - self.padding, 0)
+        y0 = max(location[1] - self.padding, 0)
+        x1 = min(location[0] + self.padding + template_width, image_width)
+        y1 = min(location[1] + self.padding + template_height, image_height)
+        if x1 - x0 < template_width or y1 - y0 < template_height:
+            return None
+        return x0, y0, x1, y1
+
+    def update(self, key, location, score, hit):
+        with self._lock:
+            self._locations[key] = (tuple(int(v) for v in location), float(score))
+            counters = self._counters.setdefault(key, {"hits": 0, "misses": 0})
+            counters["hits" if hit else "misses"] += 1
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._locations.clear()
+                self._counters.clear()
+            else:
+                self._locations.pop(key, None)
+                self._counters.pop(key, None)
+
+    def stats(self):
+        """
+        Hit/miss counters and the last match of every tracked (template, camera).
+        """
+        with self._lock:
+            stats = {}
+            for key in set(self._locations) | set(self._counters):
+                template, camera = key
+                counters = self._counters.get(key, {"hits": 0, "misses": 0})
+                location, score = self._locations.get(key, (None, None))
+                total = counters["hits"] + counters["misses"]
+                stats[f"{template}/{camera}"] = {
+                    "template": template,
+                    "camera": camera,
+                    "hits": counters["hits"],
+                    "misses": counters["misses"],
+                    "hit_rate": counters["hits"] / total if total else None,
+                    "last_location": list(location) if location else None,
+                    "last_score": score,
+                }
+            return stats
+
+
+# Process-wide tracker shared by the analysis pipelines
+tracker = LocationTracker()
@@ -0,0 +1,148 @@
+import threading
+
+import numpy as np
+
+# One row per measured dot. cls is the last class the statistics gave the dot, 0 = not classified yet
+MEASUREMENT_DTYPE = np.dtype([
+    ('dot_id', np.int64),
+    ('x', np.int64),
+    ('y', np.int64),
+    ('col', np.int64),
+    ('area', np.float64),
+    ('cls', np.int8),
+])
+
+# Rows allocated up front, the arrays double when they are full
+INITIAL_CAPACITY = 4096
+
+
+class MeasurementStore:
+    """
+    The dots measured in a session, as one growable structured array (MEASUREMENT_DTYPE).
+
+    A whole frame is appended at once and gets consecutive dot ids, so the ids are sorted and
+    "the dots of this frame" is an id range found with two binary searches. Removed dots
+    (locked class 1) are only marked in a tombstone mask, the rows are compacted when an
+    append would otherwise have to grow the arrays and at least half of them are dead.
+
+    Iterating yields [dot_id, x, y, col, area] lists of the live dots, like the list this
+    replaces, hold `lock` while working on views of the arrays.
+    """
+    def __init__(self, capacity=INITIAL_CAPACITY, first_id=1):
+        self.lock = threading.RLock()
+        self._data = np.zeros(capacity, dtype=MEASUREMENT_DTYPE)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._size = 0
+        self._live = 0
+        self.next_id = first_id
+
+    def __len__(self):
+        return self._live
+
+    def __iter__(self):
+        rows = self.view()
+        columns = zip(rows['dot_id'].tolist(), rows['x'].tolist(), rows['y'].tolist(),
+                      rows['col'].tolist(), rows['area'].tolist())
+        return (list(row) for row in columns)
+
+    def _reserve(self, count):
+        needed = self._size + count
+        if needed <= len(self._data):
+            return
+        dead = self._size - self._live
+        if dead >= self._size // 2 and self._live + count <= len(self._data):
+            self._compact()
+            return
+        capacity = max(needed, 2 * len(self._data))
+        data = np.zeros(capacity, dtype=MEASUREMENT_DTYPE)
+        alive = np.zeros(capacity, dtype=bool)
+        data[:self._size] = self._data[:self._size]
+        alive[:self._size] = self._alive[:self._size]
+        self._data, self._alive = data, alive
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._data[:len(keep)] = self._data[keep]
+        self._alive[:len(keep)] = True
+        self._alive[len(keep):self._size] = False
+        self._size = len(keep)
+
+    def append(self, dots):
+        """
+        Appends the dots [[x, y, col, area], ...] of one frame.
+
+        Returns:
+            (first_id, stop_id): the dot ids given to the new dots, first_id up to stop_id exclusive.
+        """
+        dots = np.asarray(dots, dtype=np.float64).reshape(-1, 4)
+        count = len(dots)
+        with self.lock:
+            self._reserve(count)
+            first_id = self.next_id
+            rows = self._data[self._size:self._size + count]
+            rows['dot_id'] = np.arange(first_id, first_id + count)
+            rows['x'] = dots[:, 0]
+            rows['y'] = dots[:, 1]
+            rows['col'] = dots[:, 2]
+            rows['area'] = dots[:, 3]
+            rows['cls'] = 0
+            self._alive[self._size:self._size + count] = True
+            self._size += count
+            self._live += count
+            self.next_id += count
+            return first_id, self.next_id
+
+    def rows(self):
+        """
+        View of all rows, dead ones included (see alive), valid until the next append.
+        """
+        return self._data[:self._size]
+
+    def alive(self):
+        """
+        Tombstone mask of rows(): False for removed dots.
+        """
+        return self._alive[:self._size]
+
+    def positions(self, first_id, stop_id):
+        """
+        Row positions (start, stop) of the dot ids first_id up to stop_id exclusive.
+        """
+        ids = self._data['dot_id'][:self._size]
+        return int(np.searchsorted(ids, first_id)), int(np.searchsorted(ids, stop_id))
+
+    def view(self, first_id=None, stop_id=None):
+        """
+        Copy of the live rows, optionally only the dot ids first_id up to stop_id exclusive.
+        """
+        with self.lock:
+            start, stop = 0, self._size
+            if first_id is not None:
+                start, stop = self.positions(first_id, stop_id if stop_id is not None else self.next_id)
+            return self._data[start:stop][self._alive[start:stop]]
+
+    def remove(self, dot_ids):
+        """
+        Marks the dots with the given ids as removed. Returns how many live dots were removed.
+        """
+        dot_ids = np.asarray(sorted(dot_ids) if isinstance(dot_ids, (set, frozenset)) else dot_ids,
+                             dtype=np.int64)
+        with self.lock:
+            ids = self._data['dot_id'][:self._size]
+            positions = np.searchsorted(ids, dot_ids)
+            found = positions < self._size
+            positions = positions[found][ids[positions[found]] == dot_ids[found]]
+            positions = np.unique(positions)
+            removed = int(self._alive[positions].sum())
+            self._alive[positions] = False
+            self._live -= removed
+            return removed
+
+    def clear(self):
+        """
+        Removes all dots, the dot ids keep counting.
+        """
+        with self.lock:
+            self._alive[:self._size] = False
+            self._size = 0
+            self._live = 0
@@ -0,0 +1,122 @@
+import os
+import re
+import time
+import itertools
+import threading
+
+import numpy as np
+import pandas as pd
+
+# The result log lives next to the backend
+RESULT_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'result_log')
+
+# One row per measured dot of a frame
+RESULT_DTYPE = np.dtype([
+    ('x', np.int64),
+    ('y', np.int64),
+    ('col', np.int64),
+    ('area', np.float64),
+])
+
+NO_BARCODE = 'no_barcode'
+
+
+def _partition_key(value):
+    """
+    A label or barcode as a safe directory name.
+    """
+    value = re.sub(r'[^A-Za-z0-9._-]', '_', str(value or '').strip())
+    return value or NO_BARCODE
+
+
+class ResultLog:
+    """
+    Append-only log of the measured dots, partitioned by label, barcode and time:
+
+        <directory>/<label>/<barcode>/<epoch ms>_<sequence>.npy
+
+    Every frame is one partition, a structured array (RESULT_DTYPE) written to a new file, so
+    an append costs the same however long the history is. The reader selects partitions by
+    their path before it opens any file.
+    """
+    def __init__(self, directory=RESULT_LOG_DIR):
+        self.directory = directory
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def append(self, label, dots, barcode=None, timestamp=None):
+        """
+        Writes the dots [[x, y, col, area], ...] of one frame. Returns the partition path.
+        """
+        values = np.asarray(dots, dtype=np.float64).reshape(-1, 4)
+        rows = np.empty(len(values), dtype=RESULT_DTYPE)
+        for i, field in enumerate(RESULT_DTYPE.names):
+            rows[field] = values[:, i]
+
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            sequence = next(self._sequence)
+        directory = os.path.join(self.directory, _partition_key(label), _partition_key(barcode))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{int(timestamp * 1000):013d}_{sequence:06d}.npy")
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.save(file, rows)
+        os.replace(tmp_path, path)
+        return path
+
+    def partitions(self, label=None, barcode=None, since=None, until=None):
+        """
+        The partitions matching the filters, oldest first, as (label, barcode, timestamp, path).
+        `since` / `until` are epoch seconds, inclusive.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        labels = [_partition_key(label)] if label is not None else sorted(os.listdir(self.directory))
+        partitions = []
+        for label_key in labels:
+            label_dir = os.path.join(self.directory, label_key)
+            if not os.path.isdir(label_dir):
+                continue
+            barcodes = [_partition_key(barcode)] if barcode is not None else sorted(os.listdir(label_dir))
+            for barcode_key in barcodes:
+                barcode_dir = os.path.join(label_dir, barcode_key)
+                if not os.path.isdir(barcode_dir):
+                    continue
+                for name in os.listdir(barcode_dir):
+                    if not name.endswith('.npy'):
+                        continue
+                    timestamp = int(name.split('_', 1)[0]) / 1000
+                    if since is not None and timestamp < since:
+                        continue
+                    if until is not None and timestamp > until:
+                        continue
+                    partitions.append((label_key, barcode_key, timestamp, os.path.join(barcode_dir, name)))
+        partitions.sort(key=lambda partition: (partition[2], partition[3]))
+        return partitions
+
+    def read(self, label=None, barcode=None, since=None, until=None, dot_columns=None):
+        """
+        The logged dots matching the filters as one DataFrame with the columns label, barcode,
+        timestamp, x, y, col and area. `dot_columns` optionally keeps only the dots measured in
+        these tablet columns (their `col` value), it does not select record fields.
+        """
+        frames = []
+        for label_key, barcode_key, timestamp, path in self.partitions(label, barcode, since, until):
+            rows = np.load(path)
+            if dot_columns is not None:
+                rows = rows[np.isin(rows['col'], list(dot_columns))]
+            if len(rows) == 0:
+                continue
+            frame = pd.DataFrame(rows)
+            frame.insert(0, 'timestamp', timestamp)
+            frame.insert(0, 'barcode', barcode_key)
+            frame.insert(0, 'label', label_key)
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=['label', 'barcode', 'timestamp', *RESULT_DTYPE.names])
+        return pd.concat(frames, ignore_index=True)
+
+
+# Process-wide result log of the analysis pipelines
+result_log = ResultLog()
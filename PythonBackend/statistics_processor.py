@@ -1,164 +1,244 @@
 import numpy as np
-import os
-import cv2
-import time
+import threading
+from collections import defaultdict
 import globals
+from measurement_store import MeasurementStore, MEASUREMENT_DTYPE
+
+def _column_has_mean(cols):
+    """
+    Whether calculate_statistics classifies the dots of the columns `cols` against their column
+    mean. Column 0 and columns 11-127 do, every other column (also 1-10, whose combined "1-10"
+    mean is computed but never looked up) is classified against an average of 1.0.
+    """
+    cols = np.asarray(cols)
+    return (cols == 0) | ((cols >= 11) & (cols < 128))
+
+
+def _classify_ratios(areas, avg_areas):
+    """
+    Classes of dots with the given areas and column averages, like calculate_statistics.
+    """
+    positive = avg_areas > 0
+    ratios = np.where(positive, areas / np.where(positive, avg_areas, 1), 1)
+    return np.where(ratios < 0.1, 1, np.where(ratios <= 0.9, 2, 3)).astype(np.int8)
+
+
+def classify_dots(dot_ids, cols, areas):
+    """
+    Vectorized classification kernel of calculate_statistics.
+
+    Every dot is classified by the ratio of its area to the mean area of its column, the means
+    come from one np.bincount over the column labels: below 0.1 is class 1, up to 0.9 class 2,
+    above class 3. Only column 0 and columns 11-127 use their mean, the other columns an
+    average of 1.0 (see _column_has_mean).
+
+    Returns:
+        (classes, class_counts, class1_ids): the int8 class of every dot, the number of dots of
+            class 1, 2 and 3, and the ids of the class 1 dots.
+    """
+    dot_ids = np.asarray(dot_ids, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    areas = np.asarray(areas, dtype=np.float64)
+    if len(cols) == 0:
+        return np.empty(0, dtype=np.int8), np.zeros(3, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    labels = cols - cols.min()
+    sums = np.bincount(labels, weights=areas)
+    counts = np.bincount(labels)
+    averages = np.where(_column_has_mean(cols), sums[labels] / counts[labels], 1.0)
+    classes = _classify_ratios(areas, averages)
+    class_counts = np.bincount(classes, minlength=4)[1:]
+    return classes, class_counts, dot_ids[classes == 1]
+
+
+def _measurement_rows(dot_list):
+    """
+    Live rows of a MeasurementStore, or the rows of a [[dot_id, x, y, col, area], ...] list, as
+    a structured array (MEASUREMENT_DTYPE) sorted by dot_id.
+    """
+    if isinstance(dot_list, MeasurementStore):
+        return dot_list.view()
+    values = np.asarray(list(dot_list), dtype=np.float64).reshape(-1, 5)
+    rows = np.zeros(len(values), dtype=MEASUREMENT_DTYPE)
+    for i, field in enumerate(('dot_id', 'x', 'y', 'col', 'area')):
+        rows[field] = values[:, i]
+    return rows[np.argsort(rows['dot_id'], kind='stable')]
+
 
 def calculate_statistics(dot_list, expected_counts=None):
     """
-    dot_list = [ [dot_id, x, y, col, area], ... ] from globals.measurement_data.
-    
-    We classify each dot into 1,2,3 based on area ratio.
+    dot_list = globals.measurement_data (a MeasurementStore) or [ [dot_id, x, y, col, area], ... ].
+
+    We classify each dot into 1,2,3 based on area ratio (see classify_dots).
     If a dot is class 1 => remove it from measurement_data, increment locked_class1_count.
+    expected_counts is not used by the classification.
 
     The final class 1 = newly found in this pass + locked_class1_count.
     Returns a dict: {
       "result_counts": [class1, class2, class3],
-      "classified_dots": [ (dot_id, x, y, col, area, cls), ... ]
+      "classified_dots": structured array (MEASUREMENT_DTYPE) of the dots sorted by dot_id,
+        with their class in the cls field
     }
     """
-    from collections import defaultdict
-
     try:
-        # 1) Build a list of (dot_id, x, y, col, area)
-        data = []
-        for item in dot_list:
-            dot_id, x, y, col, area = item
-            data.append((dot_id, int(x), int(y), int(col), float(area)))
-
-        # Default or provided expected counts
-        default_expected_counts = {
-            "center_circle": 360,
-            "center_slice": 510,
-            "outer_slice": 2248
-        }
-        if not expected_counts:
-            expected_counts = default_expected_counts
-
-        # 2) Group by column
-        columns = defaultdict(list)
-        for (dot_id, x, y, col, area) in data:
-            columns[col].append((dot_id, x, y, col, area))
-
-        # Compute column averages
-        column_averages = {}
-        if 0 in columns:
-            column_averages[0] = np.mean([d[4] for d in columns[0]])
-
-        combined_areas = []
-        for c in range(1, 11):
-            if c in columns:
-                combined_areas += [d[4] for d in columns[c]]
-        if combined_areas:
-            column_averages["1-10"] = np.mean(combined_areas)
-
-        for c in range(11, 128):
-            if c in columns:
-                column_averages[c] = np.mean([d[4] for d in columns[c]])
-
-        # 3) Classify
-        class_counts = {1: 0, 2: 0, 3: 0}
-        classified_with_id = []  # (dot_id, x, y, col, area, cls)
-
-        for col_val, dots_in_col in columns.items():
-            avg_area = column_averages.get(col_val, 1.0)
-            min_thresh = 0.1 * avg_area
-            max_thresh = 0.95 * avg_area
-
-            for (dot_id, x, y, col, area) in dots_in_col:
-                ratio = (area / avg_area) if avg_area > 0 else 1
-                if ratio < 0.1:
-                    ccls = 1
-                elif ratio <= 0.9:
-                    ccls = 2
-                else:
-                    ccls = 3
-
-                class_counts[ccls] += 1
-                classified_with_id.append((dot_id, x, y, col, area, ccls))
+        rows = _measurement_rows(dot_list)
+        classes, class_counts, class1_ids = classify_dots(rows['dot_id'], rows['col'], rows['area'])
+        rows['cls'] = classes
 
-        # Sort by dot_id if you like stable output
-        classified_with_id.sort(key=lambda item: item[0])
-
-        # 4) Remove newly discovered Class 1 from measurement_data
-        class1_ids = {item[0] for item in classified_with_id if item[5] == 1}
-        if class1_ids:
+        # Remove newly discovered Class 1 from measurement_data
+        if len(class1_ids):
             removed_count = remove_class1_from_data(class1_ids)
             globals.locked_class1_count += removed_count
 
-        # 5) Final class1 = newly found + locked_class1_count
-        final_class1 = class_counts[1] + globals.locked_class1_count
-        final_counts = [final_class1, class_counts[2], class_counts[3]]
-
-        # Convert to final list for "classified_dots"
-        # Keep dot_id so the route can filter out newly added ones
-        classified_dots = classified_with_id  # (dot_id,x,y,col,area,ccls)
-
+        # Final class1 = newly found + locked_class1_count
+        final_class1 = int(class_counts[0]) + globals.locked_class1_count
         return {
-            "result_counts": final_counts,
-            "classified_dots": classified_dots
+            "result_counts": [final_class1, int(class_counts[1]), int(class_counts[2])],
+            "classified_dots": rows
         }
 
     except Exception as e:
         return {"error": str(e)}
-    
-    
-def remove_class1_from_data(class1_ids):
-    """
-    From globals.measurement_data ([dot_id, x, y, col, area]),
-    remove any item whose dot_id is in class1_ids.
-    Returns how many were removed.
-    """
-    new_list = []
-    removed_count = 0
-    for item in globals.measurement_data:
-        dot_id = item[0]
-        if dot_id in class1_ids:
-            removed_count += 1
-        else:
-            new_list.append(item)
-    globals.measurement_data = new_list
-    return removed_count
 
 
-
-def save_annotated_image(image, classified_dots, output_dir="output_images"):
+class IncrementalStatistics:
     """
-    Draws classified blobs on the original image and saves it.
-
-    Args:
-        image (numpy.ndarray): The original grayscale image.
-        classified_dots (list): List of newly detected blobs with classification: [x, y, column, area, class]
-        output_dir (str): Directory to save the images.
+    calculate_statistics kept up to date batch by batch instead of recomputed over the whole
+    session. Running area sums and counts are kept per column (and for the combined "1-10"
+    group), a batch only updates the columns it touches and only the dots of columns whose
+    mean moved are reclassified. Class 1 dots are removed and locked like in
+    calculate_statistics, which moves the mean of their column for the next batch.
+
+    The dots and their classes live in a MeasurementStore (the cls field), the engine works on
+    its arrays. The class counts are the same as a full recompute: the dot areas (contour or
+    pixel areas, multiples of 0.5) sum exactly in float64, so the running means equal np.mean.
     """
-    if image is None:
-        print("No image available to annotate.")
-        return None
-
-    os.makedirs(output_dir, exist_ok=True)  # Ensure directory exists
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._sums = defaultdict(float)  # col -> sum of the areas
+            self._counts = defaultdict(int)  # col -> number of dots
+            self._group_sum = 0.0  # Columns 1-10 combined
+            self._group_count = 0
+            self._class_counts = {1: 0, 2: 0, 3: 0}
+            self._dirty = set()  # Columns whose mean moved since their dots were classified
+            self._unclassified = False  # Set by rebuild: all dots of columns without a mean are new
+
+    def rebuild(self, store):
+        """
+        Resets the engine to the live dots of `store`, all of them are classified again with the
+        next update.
+        """
+        self.reset()
+        with self._lock, store.lock:
+            rows, alive = store.rows(), store.alive()
+            rows['cls'] = 0
+            self._add_columns(rows['col'][alive], rows['area'][alive], 1)
+            self._unclassified = True
+
+    def column_average(self, col):
+        """
+        The running mean area of a column, or of the "1-10" group. None if it has no dots.
+        """
+        with self._lock:
+            if col == "1-10":
+                return self._group_sum / self._group_count if self._group_count else None
+            return self._sums[col] / self._counts[col] if self._counts.get(col) else None
+
+    def _add_columns(self, cols, areas, sign):
+        """
+        Adds (sign 1) or subtracts (sign -1) dots from the running sums, marks their columns dirty.
+        """
+        if len(cols) == 0:
+            return
+        columns, inverse = np.unique(cols, return_inverse=True)
+        sums = np.bincount(inverse, weights=areas)
+        counts = np.bincount(inverse)
+        for col, area_sum, count, has_mean in zip(columns.tolist(), sums.tolist(), counts.tolist(),
+                                                  _column_has_mean(columns).tolist()):
+            self._sums[col] += sign * area_sum
+            self._counts[col] += sign * count
+            if not self._counts[col]:
+                del self._sums[col], self._counts[col]
+            if has_mean:
+                self._dirty.add(col)
+        group = (cols >= 1) & (cols <= 10)
+        self._group_sum += sign * float(areas[group].sum())
+        self._group_count += sign * int(group.sum())
+
+    def update(self, store, new_ids=None):
+        """
+        Classifies the dots of `store` like calculate_statistics after the dots with the ids
+        new_ids = (first_id, stop_id) were appended to it (see MeasurementStore.append): class 1
+        dots are removed from the store and added to globals.locked_class1_count.
+
+        Returns the same dict as calculate_statistics, but "classified_dots" is a structured
+        array (MEASUREMENT_DTYPE) of only the new dots, with their class in the cls field.
+        """
+        try:
+            with self._lock, store.lock:
+                rows, alive = store.rows(), store.alive()
+                cols, areas, classes = rows['col'], rows['area'], rows['cls']
+                start, stop = store.positions(*new_ids) if new_ids is not None else (0, 0)
+                new = start + np.flatnonzero(alive[start:stop])
+                self._add_columns(cols[new], areas[new], 1)
+
+                # Dots of columns without a mean only depend on their own area, the columns whose
+                # mean moved are classified again
+                if self._unclassified:
+                    plain = np.flatnonzero(alive & ~_column_has_mean(cols))
+                    self._unclassified = False
+                else:
+                    plain = new[~_column_has_mean(cols[new])]
+                dirty_cols = np.array(sorted(self._dirty), dtype=np.int64)
+                members = np.flatnonzero(alive & np.isin(cols, dirty_cols))
+                dirty_averages = np.array([self._sums[col] / self._counts[col] if self._counts.get(col) else 1.0
+                                           for col in dirty_cols.tolist()])
+                positions = np.concatenate((plain, members))
+                averages = np.concatenate((np.ones(len(plain)),
+                                           dirty_averages[np.searchsorted(dirty_cols, cols[members])]))
+                self._dirty.clear()
+
+                new_classes = _classify_ratios(areas[positions], averages)
+                changes = (np.bincount(new_classes, minlength=4)
+                           - np.bincount(classes[positions], minlength=4))
+                for cls in (1, 2, 3):
+                    self._class_counts[cls] += int(changes[cls])
+                classes[positions] = new_classes
+
+                class_counts = dict(self._class_counts)
+                classified_dots = rows[new]
+
+                # Remove class 1 dots, their columns are reclassified with the next batch
+                class1 = positions[new_classes == 1]
+                self._add_columns(cols[class1], areas[class1], -1)
+                self._class_counts[1] -= len(class1)
+                class1_ids = rows['dot_id'][class1]
+
+            if len(class1_ids):
+                removed_count = remove_class1_from_data(class1_ids)
+                globals.locked_class1_count += removed_count
+
+            final_class1 = class_counts[1] + globals.locked_class1_count
+            return {
+                "result_counts": [final_class1, class_counts[2], class_counts[3]],
+                "classified_dots": classified_dots
+            }
+
+        except Exception as e:
+            return {"error": str(e)}
+
+
+# Process-wide statistics of the measurement session
+statistics_engine = IncrementalStatistics()
 
-    # Convert grayscale image to color for annotations
-    annotated_img = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
 
-    # Define colors for classification
-    colors = {
-        1: (0, 0, 255),    # Red for Class 1
-        2: (0, 255, 255),  # Yellow for Class 2
-        3: (0, 255, 0)     # Green for Class 3
-    }
-
-    # Draw circles based on classification
-    print(f"Starting to draw {len(classified_dots)} dots!")
-    i = 0
-    for dot in classified_dots:
-        x, y, col, area, cls = dot
-        radius = max(1, int(np.sqrt(area / np.pi)))  # Ensure minimum size
-        cv2.circle(annotated_img, (x, y), radius, colors.get(cls, (255, 255, 255)), 1)
-        i = i+1
-
-
-    # Save the image
-    filename = os.path.join(output_dir, f"annotated_{int(time.time())}.png")
-    cv2.imwrite(filename, annotated_img)
-    print(f"Annotated image saved: {filename}")
-    return filename
\ No newline at end of file
+def remove_class1_from_data(class1_ids):
+    """
+    Marks the dots of globals.measurement_data (a MeasurementStore) whose dot_id is in
+    class1_ids as removed. Returns how many were removed.
+    """
+    return globals.measurement_data.remove(class1_ids)
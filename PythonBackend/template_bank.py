@@ -0,0 +1,124 @@
+import cv2
+import numpy as np
+import os
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Rotated template banks are cached next to the backend as memory-mapped .npy files
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'template_cache')
+
+_banks_lock = threading.Lock()
+_banks = {}  # (template_path, scale_percent, step) -> RotatedTemplateBank
+
+
+class RotatedTemplateBank:
+    """
+    A template rotated at every angle of a fixed grid (start, start + step, ...)
+    covering the full circle, and downscaled.
+    """
+    def __init__(self, templates, step, source_stat, start=-180.0):
+        self.templates = templates  # (N, h, w) uint8, usually a read-only memmap
+        self.step = step
+        self.start = start
+        self.source_stat = source_stat  # (mtime, size) of the template file the bank was built from
+
+    def index(self, angle):
+        """
+        Index of the bank entry closest to `angle`, wrapped to the full circle.
+        """
+        return int(round((angle - self.start) / self.step)) % len(self.templates)
+
+    def rotated(self, angle):
+        """
+        The template rotated by `angle` degrees (counter-clockwise, same convention as
+        cv2.getRotationMatrix2D), snapped to the nearest bank angle.
+        """
+        return self.templates[self.index(angle)]
+
+
+def _template_stat(template_path):
+    stat = os.stat(template_path)
+    return stat.st_mtime, stat.st_size
+
+
+def _rotate(image, angle):
+    center = (image.shape[1] // 2, image.shape[0] // 2)
+    rotation_matrix = cv2.getRotationMatrix2D(center, angle, 1)
+    return cv2.warpAffine(image, rotation_matrix, (image.shape[1], image.shape[0]))
+
+
+def _downscale(image, scale_percent):
+    return cv2.resize(image, None, fx=scale_percent / 100, fy=scale_percent / 100, interpolation=cv2.INTER_AREA)
+
+
+def _build_bank(template, scale_percent, step):
+    # Rotate at full resolution and downscale afterwards, rotating the small template
+    # moves the 1-2 px dots by a pixel and ruins the correlation
+    angles = -180.0 + step * np.arange(int(round(360 / step)))
+    template_small = _downscale(template, scale_percent)
+    templates = np.empty((len(angles),) + template_small.shape, dtype=np.uint8)
+
+    def build_entry(i):
+        templates[i] = _downscale(_rotate(template, angles[i]), scale_percent)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(build_entry, range(len(angles))))
+    return templates
+
+
+def _load_or_build(template_path, scale_percent, step):
+    with open(template_path, 'rb') as file:
+        data = file.read()
+    digest = hashlib.sha1(data).hexdigest()[:16]
+
+    stem = os.path.splitext(os.path.basename(template_path))[0]
+    prefix = f"{stem}_s{scale_percent}_a{step}_"
+    cache_path = os.path.join(CACHE_DIR, f"{prefix}{digest}.npy")
+
+    if not os.path.exists(cache_path):
+        template = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if template is None:
+            raise FileNotFoundError(f"Template image could not be read: {template_path}")
+
+        templates = _build_bank(template, scale_percent, step)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+        # Write under a temporary name first so a half-written bank is never picked up
+        tmp_path = cache_path + '.tmp.npy'
+        np.save(tmp_path, templates)
+        os.replace(tmp_path, cache_path)
+        logging.info(f"Built rotated template bank {cache_path} ({len(templates)} angles)")
+
+        # Banks of older versions of this template are stale now
+        for name in os.listdir(CACHE_DIR):
+            if name.startswith(prefix) and name != os.path.basename(cache_path):
+                try:
+                    os.remove(os.path.join(CACHE_DIR, name))
+                except OSError as e:
+                    logging.warning(f"Failed to remove stale template bank {name}: {e}")
+
+    return np.load(cache_path, mmap_mode='r')
+
+
+def get_rotation_bank(template_path, scale_percent, step):
+    """
+    Returns the RotatedTemplateBank of `template_path` at `scale_percent` and an
+    angular resolution of `step` degrees.
+
+    The bank is built once, stored in CACHE_DIR keyed by the hash of the template
+    file, the scale and the step, and memory-mapped on later calls and later runs.
+    A bank is rebuilt automatically when the template file changes on disk.
+    """
+    key = (os.path.abspath(template_path), scale_percent, float(step))
+    source_stat = _template_stat(template_path)
+
+    with _banks_lock:
+        bank = _banks.get(key)
+        if bank is None or bank.source_stat != source_stat:
+            templates = _load_or_build(template_path, scale_percent, float(step))
+            bank = RotatedTemplateBank(templates, float(step), source_stat)
+            _banks[key] = bank
+
+    return bank
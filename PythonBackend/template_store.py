@@ -0,0 +1,158 @@
+import cv2
+import numpy as np
+import os
+import logging
+import threading
+
+# Template images live next to the backend
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Pixels brighter than this belong to the template shape (polygon masks)
+MASK_THRESHOLD = 10
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+def build_polygon_masks(image, kernel_size, threshold=MASK_THRESHOLD):
+    """
+    Masks of a polygon template:
+        expanded_mask: the template shape (pixels brighter than `threshold`) dilated with a
+            kernel_size x kernel_size square, 1 inside, 0 outside.
+        final_mask: 1 inside the template shape, 255 on the dilated boundary band, 0 outside.
+    """
+    original_mask = np.zeros_like(image, dtype=np.uint8)
+    original_mask[image > threshold] = 1
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    expanded_mask = cv2.dilate(original_mask, kernel, iterations=1)
+
+    final_mask = expanded_mask * 255
+    final_mask[original_mask == 1] = 1
+    return expanded_mask, final_mask
+
+
+class _TemplateEntry:
+    def __init__(self, image, stat):
+        self.image = image
+        self.stat = stat  # (mtime, size) of the file the image was decoded from
+        self.derived = {}  # key -> read-only artefact derived from the image
+
+
+class TemplateStore:
+    """
+    Decodes every template image once and keeps it, together with everything derived from
+    it (binary masks, dilated masks, downscaled levels), for all pipelines to share.
+
+    All returned arrays are read-only, copy them before modifying. A template is decoded
+    again, and its derived artefacts dropped, when the file changes on disk.
+    """
+    def __init__(self, template_dir=TEMPLATE_DIR):
+        self.template_dir = template_dir
+        self._lock = threading.RLock()
+        self._entries = {}  # template name -> _TemplateEntry
+
+    def path(self, name):
+        return os.path.join(self.template_dir, name)
+
+    def _entry(self, name):
+        template_path = self.path(name)
+        try:
+            stat = os.stat(template_path)
+        except OSError:
+            raise FileNotFoundError(f"Template image not found: {template_path}")
+        stat = (stat.st_mtime, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.stat != stat:
+                image = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+                if image is None:
+                    raise FileNotFoundError(f"Template image could not be read: {template_path}")
+                if entry is not None:
+                    logging.info(f"Template {name} changed on disk, reloaded")
+                entry = _TemplateEntry(_read_only(image), stat)
+                self._entries[name] = entry
+            return entry
+
+    def _derived(self, name, key, build):
+        with self._lock:
+            entry = self._entry(name)
+            value = entry.derived.get(key)
+            if value is None:
+                value = build(entry.image)
+                entry.derived[key] = value
+            return value
+
+    def get_template(self, name):
+        """
+        The grayscale template image.
+        """
+        return self._entry(name).image
+
+    def get_mask(self, name, threshold=MASK_THRESHOLD):
+        """
+        Binary mask of the template shape: 1 where the template is brighter than `threshold`, 0 elsewhere.
+        """
+        def build(image):
+            mask = np.zeros_like(image, dtype=np.uint8)
+            mask[image > threshold] = 1
+            return _read_only(mask)
+        return self._derived(name, ('mask', threshold), build)
+
+    def get_dilated_mask(self, name, kernel_size, threshold=MASK_THRESHOLD):
+        """
+        The binary template mask dilated with a kernel_size x kernel_size square.
+        """
+        mask = self.get_mask(name, threshold)
+
+        def build(image):
+            kernel = np.ones((kernel_size, kernel_size), np.uint8)
+            return _read_only(cv2.dilate(mask, kernel, iterations=1))
+        return self._derived(name, ('dilated_mask', kernel_size, threshold), build)
+
+    def get_polygon_masks(self, name, kernel_size, threshold=MASK_THRESHOLD):
+        """
+        (expanded_mask, final_mask) of the template, see build_polygon_masks.
+        """
+        def build(image):
+            expanded_mask, final_mask = build_polygon_masks(image, kernel_size, threshold)
+            return _read_only(expanded_mask), _read_only(final_mask)
+        return self._derived(name, ('polygon_masks', kernel_size, threshold), build)
+
+    def get_pyramid_level(self, name, factor):
+        """
+        The template downscaled by `factor` (INTER_AREA), factor 1 is the template itself.
+        """
+        if factor == 1:
+            return self.get_template(name)
+
+        def build(image):
+            return _read_only(cv2.resize(image, None, fx=1 / factor, fy=1 / factor,
+                                         interpolation=cv2.INTER_AREA))
+        return self._derived(name, ('pyramid', factor), build)
+
+
+# Process-wide store used by the processing pipelines
+store = TemplateStore()
+
+
+def get_template(name):
+    return store.get_template(name)
+
+
+def get_mask(name, threshold=MASK_THRESHOLD):
+    return store.get_mask(name, threshold)
+
+
+def get_dilated_mask(name, kernel_size, threshold=MASK_THRESHOLD):
+    return store.get_dilated_mask(name, kernel_size, threshold)
+
+
+def get_polygon_masks(name, kernel_size, threshold=MASK_THRESHOLD):
+    return store.get_polygon_masks(name, kernel_size, threshold)
+
+
+def get_pyramid_level(name, factor):
+    return store.get_pyramid_level(name, factor)
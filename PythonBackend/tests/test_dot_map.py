@@ -0,0 +1,46 @@
+import numpy as np
+
+from dot_map import DotMapStore, measure_dots, register_dots
+
+
+def slice_dots(missing_column=3, columns=8, rows=6, spacing=40):
+    """
+    A center slice dot list as the clustering reports it: one column is missing and shows up as
+    its (x, -1, col, 0) placeholder row, one dot of the grid was inferred with area 0.
+    """
+    dots = []
+    for col in range(columns):
+        x = 100 + col * spacing
+        if col == missing_column:
+            dots.append((x, -1, col, 0))
+            continue
+        for row in range(rows):
+            dots.append((x, 80 + row * spacing, col, 20.0))
+    dots[1] = (dots[1][0], dots[1][1], dots[1][2], 0)
+    return dots
+
+
+def test_record_keeps_only_measured_dots(tmp_path):
+    dots = slice_dots()
+    dot_map = DotMapStore(str(tmp_path)).record('product', 'main', 'center_slice', dots)
+
+    measured = [dot for dot in dots if dot[1] >= 0 and dot[3] > 0]
+    assert len(dot_map) == len(measured)
+    assert (dot_map.points[:, 1] >= 0).all() and (dot_map.areas > 0).all()
+    # No expected dot at the image edge where the placeholder row would have been clipped to
+    missing_x = 100 + 3 * 40
+    assert dot_map.lookup([missing_x], [0])[0] == -1
+
+
+def test_registration_ignores_missing_column(tmp_path):
+    dot_map = DotMapStore(str(tmp_path)).record('product', 'main', 'center_slice', slice_dots())
+
+    shift = np.array([5.0, -3.0])
+    centers = dot_map.points + shift
+    matrix = register_dots(dot_map, centers[:, 0], centers[:, 1])
+    assert matrix is not None
+    np.testing.assert_allclose(matrix, [[1, 0, shift[0]], [0, 1, shift[1]]], atol=1e-6)
+
+    measured = measure_dots(dot_map, centers, np.full(len(centers), 20.0), matrix)
+    assert all(area > 0 for _, _, _, area in measured)
+    assert all(y >= 0 for _, y, _, _ in measured)
@@ -0,0 +1,144 @@
+import contextlib
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pypylon")
+
+import frame_pool  # noqa: E402
+import frame_source  # noqa: E402
+import globals  # noqa: E402
+from frame_source import CameraFrameSource  # noqa: E402
+
+
+class FakeGrabResult:
+    def __init__(self, image):
+        self.image = image
+
+    def GrabSucceeded(self):
+        return True
+
+    @contextlib.contextmanager
+    def GetArrayZeroCopy(self):
+        yield self.image
+
+    def Release(self):
+        pass
+
+
+class FakeCamera:
+    """
+    An open InstantCamera whose calls take a little time, so concurrent callers overlap.
+    """
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.grabbing = False
+        self.image_handlers = []
+        self.configurations = []
+        self.image = np.zeros((48, 64), np.uint8)
+
+    def IsOpen(self):
+        return True
+
+    def IsGrabbing(self):
+        time.sleep(self.delay)
+        return self.grabbing
+
+    def StartGrabbing(self, strategy, grab_loop=None):
+        time.sleep(self.delay)
+        self.grabbing = True
+
+    def StopGrabbing(self):
+        self.grabbing = False
+
+    def RetrieveResult(self, timeout, timeout_handling):
+        time.sleep(0.01)
+        if not self.grabbing:
+            raise RuntimeError("Grabbing stopped")
+        return FakeGrabResult(self.image)
+
+    def RegisterImageEventHandler(self, handler, mode, cleanup):
+        self.image_handlers = [handler]  # RegistrationMode_ReplaceAll
+
+    def DeregisterImageEventHandler(self, handler):
+        self.image_handlers.remove(handler)
+
+    def RegisterConfiguration(self, handler, mode, cleanup):
+        self.configurations.append(handler)  # RegistrationMode_Append
+
+    def DeregisterConfiguration(self, handler):
+        self.configurations.remove(handler)
+
+
+@pytest.fixture
+def fake_camera(monkeypatch):
+    camera = FakeCamera()
+    monkeypatch.setitem(globals.cameras, 'main', camera)
+    monkeypatch.setitem(globals.stream_running, 'main', False)
+    monkeypatch.setitem(globals.stream_threads, 'main', None)
+    monkeypatch.setattr(frame_pool, 'get_settings', lambda: {})
+    return camera
+
+
+def use_mode(monkeypatch, mode):
+    monkeypatch.setattr(frame_source, 'get_settings', lambda: {'acquisition': {'mode': mode}})
+
+
+def start_concurrently(source, callers=2):
+    barrier = threading.Barrier(callers)
+    results = []
+
+    def start():
+        barrier.wait()
+        results.append(source.start())
+
+    threads = [threading.Thread(target=start) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def acquisition_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "FrameSource-main"]
+
+
+def test_concurrent_starts_run_one_poll_thread(fake_camera, monkeypatch):
+    use_mode(monkeypatch, 'poll')
+    source = CameraFrameSource('main')
+    try:
+        assert start_concurrently(source) == [True, True]
+        assert acquisition_threads() == [source._thread]
+    finally:
+        source.stop()
+    assert not acquisition_threads()
+
+
+def test_concurrent_starts_register_one_handler(fake_camera, monkeypatch):
+    use_mode(monkeypatch, 'event')
+    source = CameraFrameSource('main')
+    try:
+        assert start_concurrently(source) == [True, True]
+        assert fake_camera.image_handlers == [source._handler]
+        assert fake_camera.configurations == [source._removal_handler]
+    finally:
+        source.stop()
+    assert fake_camera.image_handlers == [] and fake_camera.configurations == []
+
+
+def test_restart_without_stop_replaces_removal_handler(fake_camera, monkeypatch):
+    use_mode(monkeypatch, 'event')
+    source = CameraFrameSource('main')
+    try:
+        assert source.start()
+        first = source._removal_handler
+        globals.stream_running['main'] = False  # Cleared without a stop()
+        assert source.start()
+        assert source._removal_handler is not first
+        assert fake_camera.configurations == [source._removal_handler]
+    finally:
+        source.stop()
+    assert fake_camera.configurations == []
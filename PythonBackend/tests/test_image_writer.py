@@ -0,0 +1,27 @@
+import threading
+
+import numpy as np
+
+from image_writer import ImageWriter
+
+
+def test_result_images_are_pending_until_written(tmp_path):
+    writer = ImageWriter()
+    release = threading.Event()
+
+    def draw(image):
+        release.wait(5)
+        return image
+
+    image = np.zeros((8, 8), np.uint8)
+    with writer.collect() as paths:
+        written = writer.submit(str(tmp_path / 'result_a.jpg'), image, draw)
+        failed = writer.submit(str(tmp_path / 'result_b.unknown_extension'), image)
+    writer.submit(str(tmp_path / 'result_c.jpg'), image)  # Not collected
+
+    assert paths == [written, failed]
+    assert writer.statuses(paths) == {written: "pending", failed: "pending"}
+    release.set()
+    assert writer.flush(5)
+    assert writer.statuses(paths) == {written: "written", failed: "failed"}
+    assert writer.status(str(tmp_path / 'never_submitted.jpg')) == "unknown"